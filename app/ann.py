@@ -0,0 +1,226 @@
+import os
+import sys
+import time
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import TruncatedSVD
+
+# Add parent directory to path so `python app/ann.py` can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.scoring import top_k
+
+# The defaults below were tuned on a synthetic 100k-book catalog (about 0.83 recall@10 for /similar).
+# Small catalogs recall less at the same settings: about 0.77 at 1k books, where nprobe 32 reaches 0.98
+# (and exact scoring is under a millisecond anyway). `python app/ann.py` reports a catalog's trade-off.
+# Dimensions of the LSA vectors (truncated SVD of the TF-IDF matrix)
+ANN_DIMS = int(os.environ.get("BOOKFINDER_ANN_DIMS", "128"))
+# "int8" keeps each vector as one byte per dimension plus a float scale, 4x smaller than "float32"
+ANN_QUANTIZE = os.environ.get("BOOKFINDER_ANN_QUANTIZE", "int8")
+# Recall/latency knob: IVF lists scanned per query, out of about sqrt(catalog size)
+ANN_NPROBE = int(os.environ.get("BOOKFINDER_ANN_NPROBE", "8"))
+# Approximate hits rescored with the exact TF-IDF cosine before the top N is taken
+ANN_CANDIDATES = int(os.environ.get("BOOKFINDER_ANN_CANDIDATES", "200"))
+# Build settings recorded with a saved index; a saved index built with other settings is rebuilt
+SETTINGS = {"dims": ANN_DIMS, "quantize": ANN_QUANTIZE}
+# Rows assigned to lists per block, so only one block of centroid scores is dense at a time
+ASSIGN_BLOCK_ROWS = 65536
+
+ARRAY_NAMES = ("components", "centroids", "assign", "vectors", "scales", "ids")
+
+def _normalize(x):
+    x = np.asarray(x, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return x / norms
+
+def _quantize(vectors, quantize):
+    if quantize != "int8":
+        return vectors.astype(np.float32), np.ones(len(vectors), dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+def _assign(vectors, centroids):
+    assign = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_BLOCK_ROWS):
+        block = vectors[start:start + ASSIGN_BLOCK_ROWS]
+        assign[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assign
+
+class ANNIndex:
+    """
+    Inverted-file (IVF) index over L2-normalised LSA vectors of the TF-IDF rows.
+    A query is projected with the SVD components, only the `nprobe` lists whose centroids are closest
+    are scanned, and the best approximate hits are rescored with the exact TF-IDF cosine.
+    """
+
+    def __init__(self, components, centroids, assign, vectors, scales, ids):
+        self.components = components
+        self.centroids = centroids
+        self.assign = assign
+        self.vectors = vectors
+        self.scales = scales
+        # Catalog ids of the indexed rows, checked before a saved index is attached to a model
+        self.ids = ids
+        # Rows of list c are rows[offsets[c]:offsets[c + 1]], ascending
+        self.rows = np.argsort(assign, kind='stable')
+        self.offsets = np.searchsorted(assign[self.rows], np.arange(len(centroids) + 1))
+
+    @classmethod
+    def build(cls, matrix, ids, dims=ANN_DIMS, n_lists=None, quantize=ANN_QUANTIZE, seed=0):
+        """Fits the projection and the lists over every row of `matrix`. Returns None for tiny catalogs."""
+        n, n_terms = matrix.shape
+        dims = min(dims, n_terms - 1, n - 1)
+        if dims < 1:
+            return None
+        svd = TruncatedSVD(n_components=dims, random_state=seed)
+        lsa = _normalize(svd.fit_transform(matrix))
+        n_lists = min(n_lists or max(1, int(np.sqrt(n))), n)
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, random_state=seed, n_init=3, batch_size=4096).fit(lsa)
+        centroids = _normalize(kmeans.cluster_centers_)
+        vectors, scales = _quantize(lsa, quantize)
+        return cls(
+            svd.components_.astype(np.float32), centroids, _assign(lsa, centroids), vectors, scales,
+            np.asarray(ids, dtype=np.int64),
+        )
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(*(arrays[name] for name in ARRAY_NAMES))
+
+    def to_arrays(self):
+        return {name: getattr(self, name) for name in ARRAY_NAMES}
+
+    @property
+    def n_rows(self):
+        return len(self.assign)
+
+    @property
+    def dims(self):
+        return self.components.shape[0]
+
+    @property
+    def quantize(self):
+        return "int8" if self.vectors.dtype == np.int8 else "float32"
+
+    def project(self, matrix):
+        """LSA vectors (float32, L2-normalised) of TF-IDF rows."""
+        return _normalize(matrix @ self.components.T)
+
+    def extended(self, matrix, ids):
+        """New index with the rows of `matrix` projected and added to their closest lists (no refit)."""
+        lsa = self.project(matrix)
+        vectors, scales = _quantize(lsa, self.quantize)
+        return ANNIndex(
+            self.components, self.centroids,
+            np.concatenate([self.assign, _assign(lsa, self.centroids)]),
+            np.concatenate([self.vectors, vectors]),
+            np.concatenate([self.scales, scales]),
+            np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)]),
+        )
+
+    def search(self, query, k, nprobe=ANN_NPROBE, exclude=None):
+        """Approximate top-k (rows, scores) for one projected query, scanning `nprobe` lists."""
+        nprobe = max(1, min(nprobe, len(self.centroids)))
+        probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        rows = np.sort(np.concatenate([self.rows[self.offsets[c]:self.offsets[c + 1]] for c in probe]))
+        if exclude is not None:
+            rows = rows[rows != exclude]
+        scores = (self.vectors[rows].astype(np.float32) @ query) * self.scales[rows]
+        return top_k(rows, scores, k)
+
+    def score(self, query_vec, matrix, candidates=ANN_CANDIDATES, nprobe=ANN_NPROBE, exclude=None):
+        """
+        Exact cosine of one TF-IDF query row against its approximate candidates.
+        Returns (doc_ids ascending, scores) like InvertedIndex.score, so top_k applies unchanged.
+        """
+        query_vec = query_vec.tocsr()
+        if query_vec.nnz == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        rows, _ = self.search(self.project(query_vec)[0], candidates, nprobe, exclude)
+        rows = np.sort(rows)
+        scores = (matrix[rows] @ query_vec.T).toarray().ravel()
+        return rows, scores
+
+def recall_report(model, queries, k=10, nprobes=(1, 2, 4, 8, 16, 32), candidates=(50, 100, 200, 400), samples=200, seed=0):
+    """
+    Recall@k of the ANN path against exact scoring, with mean latencies, for every (nprobe, candidates) pair.
+    Mood recall uses `queries` as moods; similar recall uses randomly sampled books.
+    """
+    rng = np.random.default_rng(seed)
+    matrix = model.tfidf_matrix
+    queries = [queries[i] for i in rng.choice(len(queries), min(samples, len(queries)), replace=False)]
+    query_vecs = [model.vectorizer.transform([q]) for q in queries]
+    books = rng.choice(matrix.shape[0], min(samples, matrix.shape[0]), replace=False)
+
+    def exact_similar(i):
+        scores = (matrix @ matrix[i].T).toarray().ravel()
+        scores[i] = 0
+        return np.arange(len(scores)), scores
+
+    def relevant(doc_ids, scores):
+        top, top_scores = top_k(doc_ids, scores, k)
+        return set(top[top_scores > 0].tolist())
+
+    def timed(fn, items):
+        start = time.perf_counter()
+        results = [relevant(*fn(item)) for item in items]
+        return results, (time.perf_counter() - start) / max(len(items), 1) * 1000
+
+    exact_moods, exact_mood_ms = timed(model.index.score, query_vecs)
+    exact_sims, exact_similar_ms = timed(exact_similar, books)
+
+    def recall(found, expected):
+        hits = sum(len(f & e) for f, e in zip(found, expected))
+        total = sum(len(e) for e in expected)
+        return hits / total if total else 1.0
+
+    rows = []
+    for nprobe in nprobes:
+        for cands in candidates:
+            cands = max(cands, k)
+            moods, mood_ms = timed(lambda vec: model.ann.score(vec, matrix, cands, nprobe), query_vecs)
+            sims, similar_ms = timed(lambda i: model.ann.score(matrix[i], matrix, cands, nprobe, exclude=i), books)
+            rows.append({
+                "nprobe": nprobe,
+                "candidates": cands,
+                "mood_recall": recall(moods, exact_moods),
+                "mood_ms": mood_ms,
+                "exact_mood_ms": exact_mood_ms,
+                "similar_recall": recall(sims, exact_sims),
+                "similar_ms": similar_ms,
+                "exact_similar_ms": exact_similar_ms,
+            })
+    return rows
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    from app.recommender import recommender
+
+    parser = argparse.ArgumentParser(description="Build the ANN index and report its recall against exact scoring.")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--samples", type=int, default=200, help="Moods and books sampled per setting")
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    recommender.use_ann = True
+    recommender.load_data(background_jobs=False)
+    recommender.build_ann()
+    model = recommender.model
+    if model is None or model.ann is None:
+        sys.exit("No ANN index (empty or tiny catalog).")
+
+    titles = [t for t in model.catalog.column('title').values() if t]
+    report = recall_report(model, titles, k=args.k, samples=args.samples)
+    print(f"{model.ann.n_rows} books, {model.ann.dims} dims ({model.ann.quantize}), "
+          f"{len(model.ann.centroids)} lists, recall@{args.k} vs exact")
+    print(f"{'nprobe':>6} {'cands':>6} {'mood recall':>12} {'mood ms':>8} {'similar recall':>15} {'similar ms':>11}")
+    for row in report:
+        print(f"{row['nprobe']:>6} {row['candidates']:>6} {row['mood_recall']:>12.3f} {row['mood_ms']:>8.2f} "
+              f"{row['similar_recall']:>15.3f} {row['similar_ms']:>11.2f}")
+    print(f"exact: mood {report[0]['exact_mood_ms']:.2f} ms, similar {report[0]['exact_similar_ms']:.2f} ms")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
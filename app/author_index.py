@@ -0,0 +1,153 @@
+import re
+import unicodedata
+from collections import Counter
+from difflib import SequenceMatcher
+import numpy as np
+from app.catalog import TextColumn
+from app.keyindex import KeyIndex, ARRAY_NAMES as KEY_ARRAYS
+
+# Separators between co-authors seen in the Author/Editor column ("Last, First; Last, First", "A & B", ...)
+AUTHOR_SEPARATORS = re.compile(r";|&|/|\||\band\b|\bwith\b", re.IGNORECASE)
+# Fuzzy matching (only used when nothing matches exactly): names sharing the most trigrams
+# are re-scored word by word and kept above this similarity
+FUZZY_CANDIDATES = 50
+FUZZY_THRESHOLD = 0.75
+
+def normalize_author(text):
+    """Case-folded, accent-stripped name with punctuation collapsed to single spaces."""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(re.sub(r"\W+", " ", text.casefold()).split())
+
+def split_authors(text):
+    """Individual normalized names from a (possibly multi-author) Author/Editor value."""
+    names = (normalize_author(part) for part in AUTHOR_SEPARATORS.split(str(text)))
+    return [name for name in names if name]
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class AuthorIndex:
+    """
+    Exact-token and trigram index over individual author names.
+    Postings point at distinct names (ids in order of first appearance); each name keeps the catalog rows
+    it appears on. Everything is held in arrays, so a snapshot memory-maps the index instead of rebuilding it.
+    """
+
+    def __init__(self, names, ids, rows, tokens, grams):
+        self.names = names
+        # name -> id, id -> catalog rows, word -> ids, trigram -> ids
+        self.ids = ids
+        self.rows = rows
+        self.tokens = tokens
+        self.grams = grams
+
+    @classmethod
+    def build(cls, authors):
+        empty = TextColumn.from_values([])
+        index = cls(
+            empty, KeyIndex.build([], []), KeyIndex.build([], [], text=False),
+            KeyIndex.build([], []), KeyIndex.build([], []),
+        )
+        return index.extended(authors, 0)
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        names = TextColumn(arrays["names_buffer"], arrays["names_offsets"], arrays["names_nulls"])
+        parts = {
+            part: KeyIndex.from_arrays({name: arrays[f"{part}_{name}"] for name in KEY_ARRAYS}) for part in INDEX_PARTS
+        }
+        return cls(names, **parts)
+
+    def to_arrays(self):
+        arrays = {"names_buffer": self.names.buffer, "names_offsets": self.names.offsets, "names_nulls": self.names.nulls}
+        for part in INDEX_PARTS:
+            arrays.update({f"{part}_{name}": arr for name, arr in getattr(self, part).to_arrays().items()})
+        return arrays
+
+    def extended(self, authors, start):
+        """Copy of the index with `authors` added as rows start, start+1, ... (the original is untouched)."""
+        known, new_names = {}, []
+        row_ids, rows = [], []
+        for row, author in enumerate(authors, start=start):
+            for name in dict.fromkeys(split_authors(author)):
+                name_id = known.get(name)
+                if name_id is None:
+                    name_id = self.ids.first(name)
+                    if name_id is None:
+                        name_id = len(self.names) + len(new_names)
+                        new_names.append(name)
+                    known[name] = name_id
+                row_ids.append(name_id)
+                rows.append(row)
+
+        new_ids = range(len(self.names), len(self.names) + len(new_names))
+        token_pairs = [(t, i) for name, i in zip(new_names, new_ids) for t in set(name.split())]
+        gram_pairs = [(g, i) for name, i in zip(new_names, new_ids) for g in trigrams(name)]
+        return AuthorIndex(
+            self.names.append(TextColumn.from_values(new_names)),
+            self.ids.extended(new_names, new_ids),
+            self.rows.extended(row_ids, rows),
+            self.tokens.extended([t for t, _ in token_pairs], [i for _, i in token_pairs]),
+            self.grams.extended([g for g, _ in gram_pairs], [i for _, i in gram_pairs]),
+        )
+
+    def _intersect(self, postings, keys):
+        # Name ids are sorted and unique within each posting list
+        lists = sorted((postings.get(k) for k in keys), key=len)
+        if not lists:
+            return set()
+        result = lists[0]
+        for ids in lists[1:]:
+            if len(result) == 0:
+                break
+            result = np.intersect1d(result, ids, assume_unique=True)
+        return set(result.tolist())
+
+    def _substring(self, query):
+        if len(query) < 3:
+            return {i for i, name in enumerate(self.names.values()) if query in name}
+        candidates = self._intersect(self.grams, trigrams(query))
+        return {i for i in candidates if query in self.names[i]}
+
+    def _fuzzy(self, query):
+        overlap = Counter()
+        for g in trigrams(query):
+            overlap.update(self.grams.get(g).tolist())
+        words = query.split()
+        scored = []
+        for name_id, _ in overlap.most_common(FUZZY_CANDIDATES):
+            name_words = self.names[name_id].split()
+            # Each query word against its closest word in the name ("tolkein" ~ "tolkien")
+            score = sum(
+                max(SequenceMatcher(None, w, nw).ratio() for nw in name_words) for w in words
+            ) / len(words)
+            if score >= FUZZY_THRESHOLD:
+                scored.append((-score, name_id))
+        return [name_id for _, name_id in sorted(scored)]
+
+    def lookup(self, author_name):
+        """
+        Catalog rows for an author query.
+        Substring and all-tokens (any word order) matches come back in catalog order;
+        if there are none, trigram-similar names are returned best first.
+        """
+        query = normalize_author(author_name)
+        if not query:
+            return []
+        name_ids = self._substring(query) | self._intersect(self.tokens, query.split())
+        if name_ids:
+            return sorted({row for name_id in name_ids for row in self.rows.get(name_id).tolist()})
+
+        rows, seen = [], set()
+        for name_id in self._fuzzy(query):
+            for row in self.rows.get(name_id).tolist():
+                if row not in seen:
+                    seen.add(row)
+                    rows.append(row)
+        return rows
+
+INDEX_PARTS = ("ids", "rows", "tokens", "grams")
+ARRAY_NAMES = ("names_buffer", "names_offsets", "names_nulls") + tuple(
+    f"{part}_{name}" for part in INDEX_PARTS for name in KEY_ARRAYS
+)
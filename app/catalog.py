@@ -0,0 +1,159 @@
+import numpy as np
+
+TEXT_FIELDS = ("isbn", "title", "description", "author", "cover_image")
+SELECT_COLUMNS = "id, isbn, title, description, author, cover_image, publish_year"
+
+def _to_year(value):
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+class TextColumn:
+    """Strings packed into one UTF-8 byte buffer addressed by offsets; NULLs are kept in a mask."""
+
+    def __init__(self, buffer, offsets, nulls):
+        self.buffer = buffer
+        self.offsets = offsets
+        self.nulls = nulls
+
+    @classmethod
+    def from_values(cls, values):
+        encoded = [b"" if v is None else str(v).encode("utf-8") for v in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        buffer = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        nulls = np.fromiter((v is None for v in values), dtype=bool, count=len(values))
+        return cls(buffer, offsets, nulls)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if self.nulls[i]:
+            return None
+        return self.buffer[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    def take(self, indices):
+        return [self[i] for i in indices]
+
+    def values(self):
+        return self.take(range(len(self)))
+
+    def append(self, other):
+        offsets = np.concatenate([self.offsets, other.offsets[1:] + self.offsets[-1]])
+        return TextColumn(
+            np.concatenate([self.buffer, other.buffer]), offsets, np.concatenate([self.nulls, other.nulls])
+        )
+
+class Catalog:
+    """
+    Array-backed copy of the serving fields of the books table.
+    Row i of the catalog is row i of the TF-IDF matrix.
+    """
+
+    def __init__(self, ids, years, year_nulls, columns):
+        self.ids = ids
+        self.years = years
+        self.year_nulls = year_nulls
+        self.columns = columns
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Builds a catalog from (id, isbn, title, description, author, cover_image, publish_year) rows."""
+        rows = [tuple(r) for r in rows]
+        years = [_to_year(r[6]) for r in rows]
+        # Same defaults the recommender has always used for missing fields
+        titles = [r[2] if r[2] is not None else 'Unknown Title' for r in rows]
+        authors = [r[4] if r[4] is not None else 'Unknown Author' for r in rows]
+        descriptions = [r[3] if r[3] is not None else '' for r in rows]
+        return cls(
+            np.array([r[0] for r in rows], dtype=np.int64),
+            np.array([y if y is not None else 0 for y in years], dtype=np.int64),
+            np.array([y is None for y in years], dtype=bool),
+            {
+                "isbn": TextColumn.from_values([r[1] for r in rows]),
+                "title": TextColumn.from_values(titles),
+                "description": TextColumn.from_values(descriptions),
+                "author": TextColumn.from_values(authors),
+                "cover_image": TextColumn.from_values([r[5] for r in rows]),
+            },
+        )
+
+    @classmethod
+    def from_db(cls, conn, after_id=None):
+        """Reads the catalog (optionally only rows with id > after_id) ordered by id."""
+        if after_id is None:
+            cursor = conn.execute(f"SELECT {SELECT_COLUMNS} FROM books ORDER BY id")
+        else:
+            cursor = conn.execute(f"SELECT {SELECT_COLUMNS} FROM books WHERE id > ? ORDER BY id", (after_id,))
+        return cls.from_rows(cursor.fetchall())
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def empty(self):
+        return len(self.ids) == 0
+
+    def column(self, name):
+        return self.columns[name]
+
+    def rows(self, indices):
+        """Materializes the given rows as plain dicts (native Python types) in one pass per column."""
+        indices = [int(i) for i in indices]
+        text = {name: col.take(indices) for name, col in self.columns.items()}
+        results = []
+        for pos, i in enumerate(indices):
+            results.append({
+                "id": int(self.ids[i]),
+                "isbn": text["isbn"][pos],
+                "title": text["title"][pos],
+                "description": text["description"][pos],
+                "author": text["author"][pos],
+                "cover_image": text["cover_image"][pos],
+                "publish_year": None if self.year_nulls[i] else int(self.years[i]),
+            })
+        return results
+
+    def isbn_rows(self, start=0):
+        """(isbns, rows) of the books that have an ISBN, numbering rows from `start`."""
+        pairs = [(isbn, i) for i, isbn in enumerate(self.columns["isbn"].values(), start=start) if isbn is not None]
+        return [isbn for isbn, _ in pairs], [i for _, i in pairs]
+
+    def training_text(self):
+        """Title + description per row with placeholder descriptions stripped (the text the model is fit on)."""
+        titles, descriptions = self.columns["title"], self.columns["description"]
+        for i in range(len(self)):
+            text = titles[i] + " " + descriptions[i]
+            yield text.replace("Description unavailable.", "").replace("Description loading...", "")
+
+    def append(self, other):
+        return Catalog(
+            np.concatenate([self.ids, other.ids]),
+            np.concatenate([self.years, other.years]),
+            np.concatenate([self.year_nulls, other.year_nulls]),
+            {name: col.append(other.columns[name]) for name, col in self.columns.items()},
+        )
+
+    def to_arrays(self):
+        arrays = {"ids": self.ids, "years": self.years, "year_nulls": self.year_nulls}
+        for name, col in self.columns.items():
+            arrays[f"{name}_buffer"] = col.buffer
+            arrays[f"{name}_offsets"] = col.offsets
+            arrays[f"{name}_nulls"] = col.nulls
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        columns = {
+            name: TextColumn(arrays[f"{name}_buffer"], arrays[f"{name}_offsets"], arrays[f"{name}_nulls"])
+            for name in TEXT_FIELDS
+        }
+        return cls(arrays["ids"], arrays["years"], arrays["year_nulls"], columns)
+
+ARRAY_NAMES = ("ids", "years", "year_nulls") + tuple(
+    f"{name}_{part}" for name in TEXT_FIELDS for part in ("buffer", "offsets", "nulls")
+)
@@ -1,28 +1,98 @@
-from .database import get_db_connection
+import base64
+import binascii
+import html
+import json
+import re
+from typing import Optional
+from .database import db_connection
+from .metrics import DB_QUERY_SECONDS
 from .schemas import Book
 
-def get_books(skip: int = 0, limit: int = 100):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM books WHERE description IS NOT NULL AND description != 'Description not available.' LIMIT ? OFFSET ?", (limit, skip))
-    rows = cursor.fetchall()
-    conn.close()
+# bm25() column weights for books_fts(title, author, description)
+SEARCH_WEIGHTS = "10.0, 5.0, 1.0"
+
+# Must match the WHERE clause of idx_books_described for SQLite to use the partial index
+LISTABLE = "description IS NOT NULL AND description != 'Description not available.'"
+
+def encode_cursor(book_id: int):
+    """Opaque pagination cursor for the position after/before `book_id`."""
+    return base64.urlsafe_b64encode(json.dumps({"id": int(book_id)}).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    """Book id stored in a cursor. Raises ValueError for anything we did not issue."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(padded.encode()))["id"])
+    except (KeyError, TypeError, binascii.Error, json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+@DB_QUERY_SECONDS.time(query="get_books")
+def get_books(skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        if after_id is not None:
+            # Keyset pagination: every page is an index seek, however deep
+            cursor.execute(f"SELECT * FROM books WHERE {LISTABLE} AND id > ? ORDER BY id LIMIT ?", (after_id, limit))
+        else:
+            cursor.execute(f"SELECT * FROM books WHERE {LISTABLE} ORDER BY id LIMIT ? OFFSET ?", (limit, skip))
+        rows = cursor.fetchall()
     return [dict(row) for row in rows]
 
+@DB_QUERY_SECONDS.time(query="get_book_by_isbn")
 def get_book_by_isbn(isbn: str):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM books WHERE isbn = ?", (isbn,))
-    row = cursor.fetchone()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM books WHERE isbn = ?", (isbn,))
+        row = cursor.fetchone()
     if row:
         return dict(row)
     return None
 
-def get_recent_books(limit: int = 1000):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM books ORDER BY id DESC LIMIT ?", (limit,))
-    rows = cursor.fetchall()
-    conn.close()
+@DB_QUERY_SECONDS.time(query="get_recent_books")
+def get_recent_books(limit: int = 1000, before_id: Optional[int] = None):
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        if before_id is not None:
+            cursor.execute("SELECT * FROM books WHERE id < ? ORDER BY id DESC LIMIT ?", (before_id, limit))
+        else:
+            cursor.execute("SELECT * FROM books ORDER BY id DESC LIMIT ?", (limit,))
+        rows = cursor.fetchall()
     return [dict(row) for row in rows]
+
+def build_match_query(text: str):
+    """Turns free text into an FTS5 query: every word must match, as a prefix."""
+    words = re.findall(r"\w+", text)
+    return " ".join(f'"{w}"*' for w in words)
+
+# FTS5 wraps matches in these control characters; _marked() escapes the text and turns them into <mark>
+MATCH_START, MATCH_END = "\x02", "\x03"
+
+def _marked(text: Optional[str]):
+    """HTML for a highlighted FTS5 fragment: the stored text escaped, only the matches marked up."""
+    if text is None:
+        return None
+    return html.escape(text).replace(MATCH_START, "<mark>").replace(MATCH_END, "</mark>")
+
+@DB_QUERY_SECONDS.time(query="search_books")
+def search_books(query: str, skip: int = 0, limit: int = 20):
+    match = build_match_query(query)
+    if not match:
+        return []
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT books.*,
+                   highlight(books_fts, 0, ?, ?) AS title_highlight,
+                   snippet(books_fts, 2, ?, ?, '...', 24) AS snippet,
+                   -bm25(books_fts, {SEARCH_WEIGHTS}) AS score
+            FROM books_fts JOIN books ON books.id = books_fts.rowid
+            WHERE books_fts MATCH ?
+            ORDER BY bm25(books_fts, {SEARCH_WEIGHTS})
+            LIMIT ? OFFSET ?
+        """, (MATCH_START, MATCH_END, MATCH_START, MATCH_END, match, limit, skip))
+        rows = cursor.fetchall()
+    books = [dict(row) for row in rows]
+    for book in books:
+        book["title_highlight"] = _marked(book["title_highlight"])
+        book["snippet"] = _marked(book["snippet"])
+    return books
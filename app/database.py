@@ -1,13 +1,91 @@
 import sqlite3
+import threading
+from contextlib import contextmanager
 from typing import List, Optional
 
 DB_NAME = "books.db"
 
+# Applied once when a pooled connection is opened, not on every request
+PRAGMAS = (
+    ("journal_mode", "WAL"),        # Enable WAL mode for concurrency
+    ("synchronous", "NORMAL"),      # Safe with WAL; fsync at checkpoints instead of every commit
+    ("cache_size", "-65536"),       # 64 MB page cache per connection
+    ("mmap_size", "268435456"),     # Read pages through a 256 MB memory map
+    ("temp_store", "MEMORY"),
+)
+# Prepared statements kept per connection (reused because connections are reused)
+STATEMENT_CACHE_SIZE = 256
+
+class PooledConnection(sqlite3.Connection):
+    """
+    A connection owned by one thread and reused across calls.
+    close() hands it back to the pool (rolling back anything uncommitted) instead of closing it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+
+    def close(self):
+        self.checkouts = max(0, self.checkouts - 1)
+        # Nested get_db_connection() calls in one thread share this connection; only the outermost releases it
+        if self.checkouts == 0 and self.in_transaction:
+            self.rollback()
+
+    def really_close(self):
+        super().close()
+
+class ConnectionPool:
+    """One reusable, pre-configured connection per thread."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    def _open(self):
+        conn = sqlite3.connect(
+            DB_NAME, timeout=10, factory=PooledConnection, cached_statements=STATEMENT_CACHE_SIZE
+        ) # Increased timeout
+        conn.row_factory = sqlite3.Row
+        for name, value in PRAGMAS:
+            conn.execute(f"PRAGMA {name}={value}")
+        with self._lock:
+            self.opened += 1
+        return conn
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "db_name", None) != DB_NAME:
+            conn = self._open()
+            self._local.conn = conn
+            self._local.db_name = DB_NAME
+        elif conn.checkouts == 0 and conn.in_transaction:
+            # Left mid-transaction by a caller that never released it
+            conn.rollback()
+        conn.checkouts += 1
+        return conn
+
+    def discard(self):
+        """Really closes this thread's connection (e.g. before the thread exits or the DB file is replaced)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.really_close()
+            self._local.conn = None
+
+pool = ConnectionPool()
+
 def get_db_connection():
-    conn = sqlite3.connect(DB_NAME, timeout=10) # Increased timeout
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL") # Enable WAL mode for concurrency
-    return conn
+    return pool.connection()
+
+@contextmanager
+def db_connection():
+    """Pooled connection released even if the body raises."""
+    conn = get_db_connection()
+    try:
+        yield conn
+    finally:
+        conn.close()
 
 def init_db():
     conn = get_db_connection()
@@ -23,9 +101,90 @@ def init_db():
             publish_year INTEGER
         )
     ''')
+    # Partial index over listable books: /books pages seek straight to id > cursor
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_books_described ON books(id)
+        WHERE description IS NOT NULL AND description != 'Description not available.'
+    ''')
+    # Every UPDATE or DELETE on books, so the recommender can tell that rows it already indexed changed.
+    # Pruned after each full refit (see snapshot.prune_edits); a NULL book_id marks the pruned horizon
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS book_edits (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            book_id INTEGER
+        )
+    ''')
+    cursor.executescript('''
+        CREATE TRIGGER IF NOT EXISTS books_edit_update AFTER UPDATE ON books BEGIN
+            INSERT INTO book_edits(book_id) VALUES (old.id);
+        END;
+        CREATE TRIGGER IF NOT EXISTS books_edit_delete AFTER DELETE ON books BEGIN
+            INSERT INTO book_edits(book_id) VALUES (old.id);
+        END;
+    ''')
+    # Ingestion jobs started through /sync (see app/jobs.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sync_jobs (
+            id TEXT PRIMARY KEY,
+            status TEXT,
+            row_limit INTEGER,
+            refresh INTEGER,
+            pid INTEGER,
+            created_at REAL,
+            started_at REAL,
+            finished_at REAL,
+            processed INTEGER DEFAULT 0,
+            found INTEGER DEFAULT 0,
+            inserted INTEGER DEFAULT 0,
+            new_books_indexed INTEGER,
+            error TEXT,
+            metrics TEXT
+        )
+    ''')
+    # Databases created before ingestion metrics were recorded
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(sync_jobs)")}
+    if "metrics" not in columns:
+        cursor.execute("ALTER TABLE sync_jobs ADD COLUMN metrics TEXT")
+    init_search_index(conn)
     conn.commit()
     conn.close()
 
+def init_search_index(conn):
+    """Creates the FTS5 index over title/author/description, kept in sync with books by triggers."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'books_fts'")
+    exists = cursor.fetchone() is not None
+    try:
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+                title, author, description,
+                content='books', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        print(f"Full-text search unavailable (SQLite built without FTS5?): {e}")
+        return
+    cursor.executescript('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_insert AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts(rowid, title, author, description)
+            VALUES (new.id, new.title, new.author, new.description);
+        END;
+        CREATE TRIGGER IF NOT EXISTS books_fts_delete AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts(books_fts, rowid, title, author, description)
+            VALUES ('delete', old.id, old.title, old.author, old.description);
+        END;
+        CREATE TRIGGER IF NOT EXISTS books_fts_update AFTER UPDATE ON books BEGIN
+            INSERT INTO books_fts(books_fts, rowid, title, author, description)
+            VALUES ('delete', old.id, old.title, old.author, old.description);
+            INSERT INTO books_fts(rowid, title, author, description)
+            VALUES (new.id, new.title, new.author, new.description);
+        END;
+    ''')
+    if not exists:
+        # Index rows that were inserted before the triggers existed
+        cursor.execute("INSERT INTO books_fts(books_fts) VALUES ('rebuild')")
+
 if __name__ == "__main__":
     init_db()
     print("Database initialized.")
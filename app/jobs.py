@@ -0,0 +1,175 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from app import database, metrics
+from app.database import db_connection
+
+# "refreshing": ingestion is done and the job process is updating the saved model
+ACTIVE_STATUSES = ("queued", "running", "refreshing")
+# Minimum seconds between progress writes from the ingestion process
+PROGRESS_INTERVAL = 1.0
+# Ingestion runs at a lower CPU priority than the API process
+JOB_NICENESS = 10
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _pid_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _update_job(job_id, **fields):
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    with db_connection() as conn:
+        conn.execute(f"UPDATE sync_jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+        conn.commit()
+
+def get_job(job_id):
+    """Persisted state of a sync job with its elapsed time and throughput, or None if unknown."""
+    with db_connection() as conn:
+        row = conn.execute("SELECT * FROM sync_jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None:
+        return None
+    job = dict(row)
+    job.pop("metrics", None)
+    job["limit"] = job.pop("row_limit")
+    job["refresh"] = bool(job["refresh"])
+    elapsed = None
+    if job["started_at"]:
+        elapsed = (job["finished_at"] or time.time()) - job["started_at"]
+    job["elapsed_seconds"] = elapsed
+    job["checked_per_second"] = job["processed"] / elapsed if elapsed else 0.0
+    job["inserted_per_minute"] = job["inserted"] / elapsed * 60 if elapsed else 0.0
+    return job
+
+def run_job(job_id, limit, db_name, refresh=False):
+    """
+    Entry point of the ingestion process: runs ingest_data and records its progress in sync_jobs,
+    then, with `refresh`, indexes the new books into the saved model.
+    """
+    database.DB_NAME = db_name
+    if hasattr(os, "nice"):
+        os.nice(JOB_NICENESS)
+    _update_job(job_id, status="running", pid=os.getpid(), started_at=time.time())
+
+    last_write = 0.0
+
+    def progress(counts):
+        nonlocal last_write
+        now = time.monotonic()
+        if now - last_write >= PROGRESS_INTERVAL:
+            last_write = now
+            _update_job(
+                job_id, processed=counts["processed"], found=counts["found"], inserted=counts["inserted"],
+                metrics=json.dumps(metrics.INGEST.export()),
+            )
+
+    try:
+        from scripts.ingest import CSV_PATH, ingest_data
+        counts = ingest_data(limit=limit, progress=progress)
+    except Exception as e:
+        _update_job(job_id, status="failed", error=f"{type(e).__name__}: {e}", finished_at=time.time())
+        return
+    if counts is None:
+        _update_job(job_id, status="failed", error=f"{CSV_PATH} not found", finished_at=time.time())
+        return
+    counts = dict(
+        processed=counts["processed"], found=counts["found"], inserted=counts["inserted"],
+        metrics=json.dumps(metrics.INGEST.export()),
+    )
+    if not refresh:
+        _update_job(job_id, status="succeeded", finished_at=time.time(), **counts)
+        return
+    # The job stays active until the model is saved, so no second /sync starts alongside the refresh
+    _update_job(job_id, status="refreshing", **counts)
+    try:
+        from app.recommender import recommender
+        added = recommender.update_saved_model()
+    except Exception as e:
+        _update_job(job_id, status="succeeded", finished_at=time.time(), error=f"model refresh failed: {e}")
+        return
+    _update_job(job_id, status="succeeded", finished_at=time.time(), new_books_indexed=added)
+
+def load_ingest_metrics():
+    """Loads the latest sync job's ingestion metrics into metrics.INGEST (cleared if it has none yet)."""
+    with db_connection() as conn:
+        row = conn.execute("SELECT status, pid, metrics FROM sync_jobs ORDER BY created_at DESC LIMIT 1").fetchone()
+    exported = json.loads(row["metrics"]) if row is not None and row["metrics"] else {}
+    metrics.INGEST.load(exported)
+    running = row is not None and row["status"] in ACTIVE_STATUSES and _pid_alive(row["pid"])
+    metrics.INGEST_RUNNING.set(int(running))
+
+class JobRunner:
+    """
+    Runs ingestion in a detached process, one job at a time.
+    The process outlives API restarts and reloads; it reports only through its sync_jobs row.
+    The single-job rule is checked against sync_jobs inside a write transaction, so it also holds
+    across API worker processes; a job whose process is gone is marked failed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def start(self, limit, refresh=True):
+        """Returns (job, attached): the new job, or the one already running (attached=True)."""
+        with self._lock:
+            with db_connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                active = conn.execute(
+                    f"SELECT id, pid FROM sync_jobs WHERE status IN ({', '.join('?' * len(ACTIVE_STATUSES))}) "
+                    "ORDER BY created_at DESC",
+                    ACTIVE_STATUSES,
+                ).fetchall()
+                for row in active:
+                    if _pid_alive(row["pid"]):
+                        conn.rollback()
+                        return get_job(row["id"]), True
+                    conn.execute(
+                        "UPDATE sync_jobs SET status = 'failed', error = 'interrupted', finished_at = ? WHERE id = ?",
+                        (time.time(), row["id"]),
+                    )
+                job_id = uuid.uuid4().hex[:12]
+                # Until the ingestion process reports its own pid, the job is held by this process
+                conn.execute(
+                    "INSERT INTO sync_jobs (id, status, row_limit, refresh, pid, created_at) VALUES (?, 'queued', ?, ?, ?, ?)",
+                    (job_id, limit, int(refresh), os.getpid(), time.time()),
+                )
+                conn.commit()
+
+            command = [sys.executable, "-m", "app.jobs", job_id, str(limit), database.DB_NAME]
+            if refresh:
+                command.append("--refresh")
+            pythonpath = os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get("PYTHONPATH")]))
+            # A session of its own: Ctrl-C, reloads and shutdowns of the API leave the job running
+            process = subprocess.Popen(command, env=dict(os.environ, PYTHONPATH=pythonpath), start_new_session=True)
+            threading.Thread(target=self._watch, args=(job_id, process), daemon=True).start()
+            return get_job(job_id), False
+
+    def _watch(self, job_id, process):
+        # Reaps the process (a zombie would still look alive to _pid_alive) and records a crash
+        process.wait()
+        job = get_job(job_id)
+        if job["status"] in ACTIVE_STATUSES:
+            _update_job(
+                job_id, status="failed", finished_at=time.time(),
+                error=f"ingestion process exited with code {process.returncode}",
+            )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run one sync job (started by JobRunner).")
+    parser.add_argument("job_id")
+    parser.add_argument("limit", type=int)
+    parser.add_argument("db_name")
+    parser.add_argument("--refresh", action="store_true", help="Index the new books into the saved model afterwards")
+    args = parser.parse_args()
+    run_job(args.job_id, args.limit, args.db_name, refresh=args.refresh)
@@ -0,0 +1,82 @@
+import numpy as np
+
+def _key_array(keys, text):
+    if text:
+        return np.array([str(k).encode("utf-8") for k in keys], dtype=bytes)
+    return np.asarray(list(keys), dtype=np.int64)
+
+class KeyIndex:
+    """
+    Sorted keys (UTF-8 byte strings or integers), each with an ascending run of int64 values (CSR layout).
+    Lookups bisect the key array, so an index memory-mapped from a snapshot is used as is, with nothing
+    rebuilt in Python.
+    """
+
+    def __init__(self, keys, indptr, values):
+        self.keys = keys
+        self.indptr = indptr
+        self.values = values
+
+    @classmethod
+    def build(cls, keys, values, text=True):
+        """Index over parallel sequences of keys (str if `text`, else int) and values."""
+        keys = _key_array(keys, text)
+        values = np.asarray(list(values), dtype=np.int64)
+        order = np.argsort(values, kind="stable")
+        order = order[np.argsort(keys[order], kind="stable")]
+        keys, values = keys[order], values[order]
+        unique, starts = np.unique(keys, return_index=True)
+        return cls(unique, np.append(starts, len(keys)).astype(np.int64), values)
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(arrays["keys"], arrays["indptr"], arrays["values"])
+
+    def to_arrays(self):
+        return {"keys": self.keys, "indptr": self.indptr, "values": self.values}
+
+    def get(self, key):
+        """Values of `key` (a view, empty if the key is absent)."""
+        if isinstance(key, str):
+            key = key.encode("utf-8")
+        pos = int(np.searchsorted(self.keys, key))
+        if pos < len(self.keys) and self.keys[pos] == key:
+            return self.values[self.indptr[pos]:self.indptr[pos + 1]]
+        return self.values[:0]
+
+    def first(self, key):
+        values = self.get(key)
+        return int(values[0]) if len(values) else None
+
+    def extended(self, keys, values):
+        """
+        New index with (key, value) pairs added; each new value must be larger than the key's existing ones
+        (e.g. rows appended to the catalog), so merged runs stay sorted. The original is untouched.
+        """
+        new = KeyIndex.build(keys, values, text=self.keys.dtype.kind == "S")
+        if len(new.keys) == 0:
+            return self
+        old_keys = np.asarray(self.keys)
+        merged = np.union1d(old_keys, new.keys)
+        old_at = np.searchsorted(merged, old_keys)
+        new_at = np.searchsorted(merged, new.keys)
+        old_counts = np.diff(self.indptr)
+        new_counts = np.diff(new.indptr)
+        counts = np.zeros(len(merged), dtype=np.int64)
+        counts[old_at] += old_counts
+        counts[new_at] += new_counts
+        indptr = np.zeros(len(merged) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+
+        # Each merged run is the key's old values followed by its new ones
+        values = np.empty(indptr[-1], dtype=np.int64)
+        owner = np.repeat(np.arange(len(old_keys)), old_counts)
+        values[indptr[old_at][owner] + np.arange(len(self.values)) - self.indptr[owner]] = self.values
+        shift = np.zeros(len(merged), dtype=np.int64)
+        shift[old_at] = old_counts
+        owner = np.repeat(np.arange(len(new.keys)), new_counts)
+        start = indptr[new_at] + shift[new_at]
+        values[start[owner] + np.arange(len(new.values)) - new.indptr[owner]] = new.values
+        return KeyIndex(merged, indptr, values)
+
+ARRAY_NAMES = ("keys", "indptr", "values")
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Body
+from fastapi import FastAPI, HTTPException, Body, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from typing import List, Optional
@@ -8,10 +8,10 @@ import os
 # Ensure we can import from app
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app import crud, schemas, database, recommender
-from scripts.ingest import ingest_data
+from app import crud, schemas, database, recommender, jobs, metrics
 
 app = FastAPI(title="BookFinder API", description="API for searching and retrieving book data.")
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
@@ -21,19 +21,56 @@ def startup_event():
     database.init_db()
     # Pre-load recommender
     recommender.recommender.load_data()
+    # Sync jobs (and, in shared mode, other workers) re-index or refit; serve their snapshots as they appear
+    recommender.recommender.watch_snapshots()
 
 @app.get("/", tags=["Root"])
 def read_root():
     return FileResponse('app/static/index.html')
 
+def cursor_id(cursor: Optional[str], after_id: Optional[int]):
+    if cursor is None:
+        return after_id
+    try:
+        return crud.decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def set_next_cursor(response: Response, books: List[dict], limit: int):
+    # A short page is the last one
+    if books and len(books) == limit:
+        response.headers["X-Next-Cursor"] = crud.encode_cursor(books[-1]["id"])
+
 @app.get("/books", response_model=List[schemas.Book], tags=["Books"])
-def read_books(skip: int = 0, limit: int = 100):
+def read_books(response: Response, skip: int = 0, limit: int = 100, after_id: Optional[int] = None, cursor: Optional[str] = None):
     """
     Get a list of books with pagination.
+    Pass the X-Next-Cursor response header back as `cursor` (or an id as `after_id`) for the next page;
+    `skip` still works but deep offsets are slower.
     """
-    books = crud.get_books(skip=skip, limit=limit)
+    books = crud.get_books(skip=skip, limit=limit, after_id=cursor_id(cursor, after_id))
+    set_next_cursor(response, books, limit)
     return books
 
+@app.get("/books/recent", response_model=List[schemas.Book], tags=["Books"])
+def read_recent_books(response: Response, limit: int = 100, cursor: Optional[str] = None):
+    """
+    Get the most recently added books, newest first, with cursor pagination.
+    """
+    books = crud.get_recent_books(limit=limit, before_id=cursor_id(cursor, None))
+    set_next_cursor(response, books, limit)
+    return books
+
+@app.get("/search", response_model=List[schemas.SearchResult], tags=["Books"])
+def search_books(q: str, skip: int = 0, limit: int = 20):
+    """
+    Keyword search over title, author and description (BM25 ranked, prefix matching).
+    Matches are wrapped in <mark> tags in title_highlight and snippet.
+    """
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Query cannot be empty")
+    return crud.search_books(q, skip=skip, limit=limit)
+
 @app.get("/books/{isbn}", response_model=schemas.Book, tags=["Books"])
 def read_book(isbn: str):
     """
@@ -56,6 +93,30 @@ def recommend_books(request: schemas.RecommendationRequest):
     recommended = recommender.recommender.recommend(mood)
     return recommended
 
+# Moods accepted by one /recommend/batch call
+MAX_BATCH_MOODS = 100
+
+@app.post("/recommend/batch", tags=["Recommendations"])
+def recommend_books_batch(request: schemas.BatchRecommendationRequest):
+    """
+    Recommend books for several moods at once (e.g. to pre-render mood shelves).
+    Returns one {mood, top_n, books} entry per query, in request order.
+    """
+    queries = request.queries
+    if not queries:
+        raise HTTPException(status_code=400, detail="At least one mood is required")
+    if len(queries) > MAX_BATCH_MOODS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_MOODS} moods per request")
+    for q in queries:
+        if not q.mood:
+            raise HTTPException(status_code=400, detail="Mood cannot be empty")
+
+    results = recommender.recommender.recommend_batch([(q.mood, q.top_n) for q in queries])
+    return [
+        {"mood": q.mood, "top_n": q.top_n, "books": books}
+        for q, books in zip(queries, results)
+    ]
+
 @app.get("/books/{isbn}/similar", response_model=List[schemas.Book], tags=["Recommendations"])
 def get_similar_books(isbn: str, limit: int = 5):
     """
@@ -76,17 +137,64 @@ def get_books_by_author(name: str, skip_isbn: Optional[str] = None, limit: int =
     return books
 
 @app.post("/reload", tags=["Admin"])
-def reload_model():
+def reload_model(full: bool = False):
     """
     Reloads the recommendation model (useful after data ingestion).
+    By default only newly ingested books are indexed; pass full=true to refit everything.
+    A full refit runs in the background and is swapped in when ready; requests keep using
+    the current model until then.
     """
-    recommender.recommender.load_data()
-    return {"message": "Model reloaded"}
+    if full:
+        if recommender.recommender.schedule_refit():
+            return {"message": "Full model rebuild started in background"}
+        return {"message": "Full model rebuild already running"}
+    added = recommender.recommender.update_index()
+    return {"message": "Model updated", "new_books": added}
+
+@app.get("/cache/stats", tags=["Admin"])
+def cache_stats():
+    """
+    Hit/miss/eviction counters of the recommendation result cache.
+    """
+    stats = recommender.recommender.cache.stats()
+    stats["generation"] = recommender.recommender.generation
+    stats["rebuild_running"] = recommender.recommender.refit_running()
+    return stats
+
+@app.get("/metrics", tags=["Admin"])
+def read_metrics():
+    """
+    Metrics in the Prometheus text format: request latency per route, recommender stage timings,
+    model size and load times, SQLite query timings and the latest ingestion job's counters.
+    Each worker process reports its own values.
+    """
+    jobs.load_ingest_metrics()
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+# Ingestion and the model refresh after it run in a detached process; sync_jobs is the only link to it
+sync_runner = jobs.JobRunner()
 
 @app.post("/sync", tags=["Admin"])
-def sync_data(background_tasks: BackgroundTasks, limit: int = 100):
+def sync_data(limit: int = 100, refresh: bool = True):
+    """
+    Trigger data ingestion in a background process.
+    Only one ingestion runs at a time: while one is active, this returns that job instead.
+    With refresh=true the job then adds the new books to the saved recommendation model,
+    which the API picks up within BOOKFINDER_SNAPSHOT_POLL seconds.
+    """
+    job, attached = sync_runner.start(limit, refresh=refresh)
+    if attached:
+        message = f"Data ingestion already running (Limit: {job['limit']})"
+    else:
+        message = f"Data ingestion started in background (Limit: {limit})"
+    return {"message": message, "job_id": job["id"], "attached": attached, "job": job}
+
+@app.get("/sync/{job_id}", response_model=schemas.SyncJob, tags=["Admin"])
+def sync_status(job_id: str):
     """
-    Trigger data ingestion in the background.
+    Progress of an ingestion job: books checked and inserted so far and the throughput.
     """
-    background_tasks.add_task(ingest_data, limit=limit)
-    return {"message": f"Data ingestion started in background (Limit: {limit})"}
+    job = jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Sync job not found")
+    return job
@@ -0,0 +1,276 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ContextDecorator
+
+# Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Request, query and stage latencies (seconds)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Model loads, refits and index builds (seconds)
+DURATION_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _number(value):
+    if isinstance(value, int):
+        return str(value)
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+class Registry:
+    """A set of metrics rendered together. Collectors run before each render to refresh gauges."""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def add_collector(self, collect):
+        self._collectors.append(collect)
+
+    def render(self):
+        for collect in self._collectors:
+            try:
+                collect()
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+        return "".join(metric.render() for metric in self._metrics)
+
+    def export(self):
+        """All current values as JSON-serialisable data (to hand metrics to another process)."""
+        return {metric.name: metric.export() for metric in self._metrics}
+
+    def load(self, exported):
+        """Replaces every value with those of an export(); metrics missing from it are cleared."""
+        for metric in self._metrics:
+            metric.load(exported.get(metric.name, []))
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        (REGISTRY if registry is None else registry).register(self)
+
+    def _key(self, labels):
+        try:
+            return tuple(str(labels[name]) for name in self.labelnames)
+        except KeyError as e:
+            raise ValueError(f"{self.name} needs labels {self.labelnames}, got {tuple(labels)}") from e
+
+    def _samples(self, key, value):
+        yield "", (), value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}\n", f"# TYPE {self.name} {self.kind}\n"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            base = list(zip(self.labelnames, key))
+            for suffix, extra, sample in self._samples(key, value):
+                lines.append(f"{self.name}{suffix}{_labels(base + list(extra))} {_number(sample)}\n")
+        return "".join(lines)
+
+    def export(self):
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def load(self, exported):
+        with self._lock:
+            self._values = {tuple(key): value for key, value in exported}
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value, **labels):
+        """Mirrors a count that is already kept elsewhere (e.g. the result cache's hit counter)."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+class _Timer(ContextDecorator):
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+    def _recreate_cm(self):
+        # Used as a decorator, each call gets its own start time
+        return _Timer(self.histogram, self.labels)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # One count per bucket, the +Inf overflow, then the sum
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[i] += 1
+            counts[-1] += value
+
+    def time(self, **labels):
+        """Context manager (or decorator) observing the elapsed seconds of its block."""
+        return _Timer(self, labels)
+
+    def _samples(self, key, counts):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            yield "_bucket", (("le", _number(bound)),), cumulative
+        yield "_sum", (), counts[-1]
+        yield "_count", (), cumulative
+
+    def value(self, **labels):
+        """Number of observations."""
+        with self._lock:
+            counts = self._values.get(self._key(labels))
+        return sum(counts[:-1]) if counts else 0
+
+class StageTimer:
+    """Times consecutive stages of one operation: call stage(name) as each one finishes."""
+
+    def __init__(self, histogram, operation):
+        self.histogram = histogram
+        self.operation = operation
+        self.last = time.perf_counter()
+
+    def stage(self, name):
+        now = time.perf_counter()
+        self.histogram.observe(now - self.last, operation=self.operation, stage=name)
+        self.last = now
+
+class MetricsMiddleware:
+    """ASGI middleware recording HTTP_REQUEST_SECONDS per method, route template and status."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # The template (/books/{isbn}), not the raw path, so label values stay bounded
+            path = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start, method=scope["method"], route=path, status=status
+            )
+
+# API process
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "bookfinder_http_request_duration_seconds", "API request latency by route.", ("method", "route", "status")
+)
+RECOMMENDER_STAGE_SECONDS = Histogram(
+    "bookfinder_recommender_stage_seconds",
+    "Time spent in each stage of a recommender operation (transform, score, top_k, materialize, ...).",
+    ("operation", "stage"),
+)
+MODEL_LOAD_SECONDS = Histogram(
+    "bookfinder_model_load_seconds",
+    "Duration of model loads (fit, snapshot), incremental updates and table/index builds.",
+    ("kind",), buckets=DURATION_BUCKETS,
+)
+MODEL_BOOKS = Gauge("bookfinder_model_books", "Books in the served model.")
+MODEL_APPENDED_BOOKS = Gauge("bookfinder_model_appended_books", "Books added to the served model since its last full fit.")
+MODEL_TERMS = Gauge("bookfinder_model_terms", "Vocabulary size of the served model.")
+MODEL_NONZEROS = Gauge("bookfinder_model_nonzeros", "Non-zero entries of the TF-IDF matrix.")
+MODEL_BYTES = Gauge("bookfinder_model_bytes", "Bytes of model arrays by part (memory-mapped arrays included).", ("part",))
+MODEL_GENERATION = Gauge("bookfinder_model_generation", "Generation of the served model (increments on every publish).")
+RESULT_CACHE_REQUESTS = Counter(
+    "bookfinder_result_cache_requests_total", "Result cache lookups by outcome.", ("result",)
+)
+RESULT_CACHE_ENTRIES = Gauge("bookfinder_result_cache_entries", "Entries in the result cache.")
+DB_QUERY_SECONDS = Histogram("bookfinder_db_query_duration_seconds", "SQLite query time of crud functions.", ("query",))
+
+# Ingestion process. The API shows the latest /sync job's values, which that process stores in sync_jobs
+INGEST = Registry()
+
+INGEST_FETCHES = Counter(
+    "bookfinder_ingest_fetches_total",
+    "Ingestion HTTP requests by API and outcome (ok, rate_limited, http_error, error, cached).",
+    ("source", "outcome"), registry=INGEST,
+)
+INGEST_LOOKUPS = Counter(
+    "bookfinder_ingest_lookups_total",
+    "Books looked up, by the fallback method that found the description (none: not found).",
+    ("method",), registry=INGEST,
+)
+INGEST_BOOKS = Counter(
+    "bookfinder_ingest_books_total", "Books processed, found and inserted by ingestion.", ("stage",), registry=INGEST
+)
+INGEST_INSERT_RATE = Gauge(
+    "bookfinder_ingest_inserts_per_second", "Books inserted per second since the ingestion run started.", registry=INGEST
+)
+INGEST_WRITE_RATE = Gauge(
+    "bookfinder_ingest_db_write_rows_per_second", "Rows per second of DB time spent in the ingestion writer.",
+    registry=INGEST,
+)
+INGEST_LAST_PROGRESS = Gauge(
+    "bookfinder_ingest_last_progress_timestamp_seconds", "Unix time of the ingestion run's last heartbeat.",
+    registry=INGEST,
+)
+INGEST_RUNNING = Gauge("bookfinder_ingest_job_running", "1 while a /sync ingestion job is running.", registry=INGEST)
+
+def render():
+    """The API's metrics followed by those of the latest ingestion job."""
+    return REGISTRY.render() + INGEST.render()
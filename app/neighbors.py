@@ -0,0 +1,97 @@
+import numpy as np
+
+NEIGHBOR_K = 20
+# Dense score block per chunk is kept under this many bytes (RAM matters: see exit code 137)
+BLOCK_BYTES = 32 * 1024 * 1024
+
+def compute_neighbors(matrix, k=NEIGHBOR_K, block_bytes=BLOCK_BYTES):
+    """
+    Top-k cosine neighbours for every row of an L2-normalised TF-IDF matrix.
+    Rows are scored in chunks of sparse x sparse products so only one block is dense at a time.
+    Returns (neighbors, scores); missing neighbours are -1 with score 0.
+    """
+    n = matrix.shape[0]
+    k = max(0, min(k, n - 1))
+    neighbors = np.full((n, k), -1, dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float32)
+    if k == 0:
+        return neighbors, scores
+
+    matrix = matrix.tocsr()
+    matrix_t = matrix.T.tocsc()
+    chunk_rows = max(1, block_bytes // (n * 8))
+
+    for start in range(0, n, chunk_rows):
+        stop = min(start + chunk_rows, n)
+        block = (matrix[start:stop] @ matrix_t).toarray()
+        # A book is never its own neighbour
+        block[np.arange(stop - start), np.arange(start, stop)] = -1.0
+        neighbors[start:stop], scores[start:stop] = _top_rows(block, k)
+
+    return neighbors, scores
+
+def extend_neighbors(neighbors, scores, matrix, block_bytes=BLOCK_BYTES):
+    """
+    The compute_neighbors table of `matrix`, given the table of its first len(neighbors) rows.
+    Only the appended rows are scored, against every row, so the cost grows with the number of
+    appended rows instead of the square of the catalog: each appended row gets its own top-k and
+    each existing row merges the appended rows into its list. Equal to a full rebuild up to the order of ties.
+    """
+    n, start, k = matrix.shape[0], len(neighbors), neighbors.shape[1]
+    new_neighbors = np.full((n, k), -1, dtype=np.int32)
+    new_scores = np.zeros((n, k), dtype=np.float32)
+    new_neighbors[:start] = neighbors
+    new_scores[:start] = scores
+    if n == start or k == 0:
+        return new_neighbors, new_scores
+
+    matrix = matrix.tocsr()
+    matrix_t = matrix.T.tocsc()
+    chunk_rows = max(1, block_bytes // (n * 8))
+    for a in range(start, n, chunk_rows):
+        b = min(a + chunk_rows, n)
+        block = (matrix[a:b] @ matrix_t).toarray()
+        block[np.arange(b - a), np.arange(a, b)] = -1.0
+        new_neighbors[a:b], new_scores[a:b] = _top_rows(block, k)
+
+    # Existing rows: current list plus a score for every appended row, then top-k again
+    added_t = matrix[start:].T.tocsc()
+    added_ids = np.arange(start, n, dtype=np.int32)
+    chunk_rows = max(1, block_bytes // ((n - start + k) * 8))
+    for a in range(0, start, chunk_rows):
+        b = min(a + chunk_rows, start)
+        block = np.hstack([new_scores[a:b], (matrix[a:b] @ added_t).toarray()])
+        columns = np.hstack([new_neighbors[a:b], np.broadcast_to(added_ids, (b - a, n - start))])
+        new_neighbors[a:b], new_scores[a:b] = _top_rows(block, k, columns)
+
+    return new_neighbors, new_scores
+
+def _top_rows(block, k, columns=None):
+    """
+    Per row of a dense score block, the k best columns (mapped through `columns` if given) and their
+    scores, best first; entries without a positive score are -1 with score 0.
+    """
+    top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(block, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    top = np.take_along_axis(top, order, axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+    if columns is not None:
+        top = np.take_along_axis(columns, top, axis=1)
+
+    keep = top_scores > 0
+    return np.where(keep, top, -1), np.where(keep, top_scores, 0)
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import sys
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app.recommender import recommender
+
+    parser = argparse.ArgumentParser(description="Build the model snapshot and precompute the /similar neighbour table.")
+    parser.add_argument("--k", type=int, default=NEIGHBOR_K)
+    args = parser.parse_args()
+
+    recommender.load_data(background_jobs=False)
+    recommender.build_neighbors(k=args.k)
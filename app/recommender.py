@@ -1,120 +1,743 @@
-import pandas as pd
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
 import numpy as np
+from scipy import sparse
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 from app.database import get_db_connection
+from app import snapshot
+from app.catalog import Catalog
+from app.cache import ResultCache, normalize_query
+from app.author_index import AuthorIndex, normalize_author
+from app.keyindex import KeyIndex
+from app.neighbors import compute_neighbors, extend_neighbors, NEIGHBOR_K
+from app.scoring import InvertedIndex, top_k
+from app import ann
+from app import metrics
+from app.metrics import StageTimer, RECOMMENDER_STAGE_SECONDS, MODEL_LOAD_SECONDS
+
+VECTORIZER_PARAMS = {'stop_words': 'english', 'max_features': 5000}
+
+# Incremental updates reuse the frozen vocabulary; a full refit is scheduled once drift passes these
+REFIT_NEW_DOCS_FRACTION = float(os.environ.get("BOOKFINDER_REFIT_NEW_DOCS_FRACTION", "0.25"))
+REFIT_OOV_TERMS = int(os.environ.get("BOOKFINDER_REFIT_OOV_TERMS", "500"))
+
+# "shared": for several uvicorn workers. One process fits and writes the snapshot, and every worker
+# serves the same memory-mapped arrays, polling for snapshots written by the others
+MODEL_MODE = os.environ.get("BOOKFINDER_MODEL_MODE", "local")
+SNAPSHOT_POLL_SECONDS = float(os.environ.get("BOOKFINDER_SNAPSHOT_POLL", "2"))
+
+# "ann": serve /recommend and /similar from the approximate index in app/ann.py (for very large catalogs)
+RETRIEVAL_MODE = os.environ.get("BOOKFINDER_RETRIEVAL", "exact")
+
+def build_vectorizer(terms=None, idf=None):
+    """Creates the TF-IDF vectorizer, optionally restoring a previously fitted vocabulary."""
+    vectorizer = TfidfVectorizer(**VECTORIZER_PARAMS)
+    if terms is not None:
+        vectorizer.vocabulary_ = {str(term): i for i, term in enumerate(terms)}
+        vectorizer.idf_ = np.asarray(idf)
+    return vectorizer
+
+class Model:
+    """
+    One complete version of the recommender: vectorizer, matrix, posting lists, catalog and lookups.
+    A published Model is never modified. Updates build a new one and swap a single reference,
+    so a request that picked up a model sees a consistent view until it finishes.
+    """
+
+    def __init__(self, vectorizer, matrix, catalog, fit_id=None, fitted_rows=0, appended_rows=0,
+                 neighbors=None, isbn_index=None, author_index=None, index=None, ann_index=None, edit_seq=0,
+                 oov_terms=None):
+        self.vectorizer = vectorizer
+        self.tfidf_matrix = matrix
+        if index is None and matrix is not None:
+            index = InvertedIndex(matrix)
+        self.index = index
+        self.catalog = catalog
+        # Lookups are arrays (bisected, not hashed) so snapshots memory-map them instead of rebuilding them
+        if isbn_index is None:
+            isbn_index = KeyIndex.build(*catalog.isbn_rows())
+        self.isbn_index = isbn_index
+        if author_index is None:
+            author_index = AuthorIndex.build(catalog.column('author').values())
+        self.author_index = author_index
+        self.fit_id = fit_id
+        self.fitted_rows = fitted_rows
+        self.appended_rows = appended_rows
+        # Books per unseen term among the appended rows (vocabulary drift since the last full fit)
+        self.oov_terms = Counter(oov_terms or {})
+        # Latest book edit the model reflects: later edits to its rows need a full refit
+        self.edit_seq = edit_seq
+        # Precomputed top-K table for /similar (rows beyond its length fall back to on-the-fly)
+        self.neighbors = neighbors
+        # Approximate index (ANN retrieval mode only; exact scoring is used until it is attached)
+        self.ann = ann_index
+        # Set when the model is published; cached results are keyed by it
+        self.generation = 0
+
+    def replace(self, **changes):
+        """Shallow copy with some attributes changed (the arrays themselves are shared)."""
+        model = object.__new__(Model)
+        model.__dict__.update(self.__dict__)
+        model.__dict__.update(changes)
+        return model
+
+    def appended(self, new_books, edit_seq):
+        """New Model with `new_books` vectorized by the frozen vocabulary and added after the existing rows."""
+        texts = list(new_books.training_text())
+        new_matrix = self.vectorizer.transform(texts)
+        start = len(self.catalog)
+        oov_terms = Counter(self.oov_terms)
+        analyzer, vocab = self.vectorizer.build_analyzer(), self.vectorizer.vocabulary_
+        for text in texts:
+            oov_terms.update({term for term in analyzer(text) if term not in vocab})
+        ann_index = self.ann.extended(new_matrix, new_books.ids) if self.ann is not None else None
+        return Model(
+            self.vectorizer,
+            sparse.vstack([self.tfidf_matrix, new_matrix], format='csr'),
+            self.catalog.append(new_books),
+            fit_id=self.fit_id,
+            fitted_rows=self.fitted_rows,
+            appended_rows=self.appended_rows + len(new_books),
+            neighbors=self.neighbors,
+            index=self.index.extended(new_matrix),
+            isbn_index=self.isbn_index.extended(*new_books.isbn_rows(start)),
+            author_index=self.author_index.extended(new_books.column('author').values(), start),
+            ann_index=ann_index,
+            edit_seq=edit_seq,
+            oov_terms=oov_terms,
+        )
+
+def model_from_snapshot(snap):
+    """Model over the memory-mapped arrays of a loaded snapshot."""
+    catalog = snap['catalog']
+    return Model(
+        build_vectorizer(snap['terms'], snap['idf']), snap['matrix'], catalog,
+        fit_id=snap['stats'].get('fit_id'),
+        fitted_rows=snap['stats'].get('fitted_rows', len(catalog)),
+        appended_rows=snap['stats'].get('appended_rows', 0),
+        index=snap['index'],
+        isbn_index=snap['isbn_index'],
+        author_index=snap['author_index'],
+        edit_seq=snap['stats'].get('edit_seq', 0),
+        oov_terms=snap['stats'].get('oov_terms'),
+    )
+
+def snapshot_differs(meta, model):
+    """True if the snapshot described by `meta` is not the version `model` was built from."""
+    if meta is None:
+        return False
+    if model is None or model.tfidf_matrix is None:
+        return True
+    return (meta['stats'].get('fit_id'), meta['shape'][0]) != (model.fit_id, model.tfidf_matrix.shape[0])
 
 class Recommender:
     def __init__(self):
-        self.vectorizer = None
-        self.tfidf_matrix = None
-        self.df = None
-        self.load_data()
+        # The model is loaded by the app's startup hook (or lazily on first recommend)
+        self.model = None
+        self.shared = MODEL_MODE == "shared"
+        self.use_ann = RETRIEVAL_MODE == "ann"
+        # Serializes publishing; readers never take it
+        self._publish_lock = threading.RLock()
+        self._neighbor_thread = None
+        self._ann_thread = None
+        self._refit_thread = None
+        self.cache = ResultCache()
 
-    def load_data(self):
-        """Loads data from the database and retrains the model."""
+    @property
+    def generation(self):
+        model = self.model
+        return model.generation if model is not None else 0
+
+    def _publish(self, model):
+        """Makes `model` the one new requests use; requests already running keep the previous one."""
+        with self._publish_lock:
+            model.generation = self.generation + 1
+            self.model = model
+            # Entries of older generations can no longer be hit; drop them
+            self.cache.clear()
+
+    def _cached(self, model, key, compute):
+        key = (model.generation,) + key
+        results = self.cache.get(key)
+        if results is None:
+            results = compute()
+            if results is None:
+                return []
+            self.cache.put(key, results)
+        return results
+
+    def _build_lock(self):
+        """Shared mode: one process at a time fits or extends the model and writes the snapshot."""
+        return snapshot.file_lock("build") if self.shared else nullcontext(True)
+
+    def load_data(self, force_refit=False, background_jobs=True):
+        """
+        Builds a model from the database, reusing the on-disk snapshot unless the data changed,
+        and swaps it in. Requests keep being served by the current model meanwhile.
+        """
+        start = time.perf_counter()
         conn = get_db_connection()
         try:
-            self.df = pd.read_sql_query("SELECT * FROM books", conn)
-            if not self.df.empty:
-                # Fill missing values
-                self.df['title'] = self.df['title'].fillna('Unknown Title')
-                self.df['author'] = self.df['author'].fillna('Unknown Author')
-                self.df['description'] = self.df['description'].fillna('')
-                
-                # Combine Title and Description for better matching
-                self.df['combined_text'] = self.df['title'] + " " + self.df['description']
-                self.df['combined_text'] = self.df['combined_text'].apply(
-                    lambda x: x.replace("Description unavailable.", "").replace("Description loading...", "")
-                )
-                
-                self.vectorizer = TfidfVectorizer(stop_words='english', max_features=5000)
-                self.tfidf_matrix = self.vectorizer.fit_transform(self.df['combined_text'])
-                
-                print(f"Recommender loaded with {len(self.df)} books.")
-            else:
-                print("No books found in DB.")
+            # Shared mode: the first worker fits while the others wait here, then finds the fresh snapshot
+            with self._build_lock():
+                # One read transaction, so the fingerprint describes exactly the rows that are read
+                conn.execute("BEGIN")
+                fingerprint = snapshot.db_fingerprint(conn)
+                snap = None if force_refit else snapshot.load_snapshot(fingerprint)
+                source = " (from snapshot)"
+                if snap is None:
+                    catalog = Catalog.from_db(conn)
+                    conn.commit()
+                    model = None
+                    if not catalog.empty:
+                        # Combine Title and Description for better matching (the text is not kept after fitting)
+                        vectorizer = build_vectorizer()
+                        matrix = vectorizer.fit_transform(catalog.training_text())
+                        model = Model(
+                            vectorizer, matrix, catalog, fit_id=str(int(time.time() * 1000)), fitted_rows=len(catalog),
+                            edit_seq=fingerprint[2],
+                        )
+                        if self._save_snapshot(model, fingerprint):
+                            self._prune_edits(conn, model.edit_seq)
+                        source = ""
+                        if self.shared:
+                            # Serve the memory-mapped copy like every other worker instead of a private one
+                            snap = snapshot.load_snapshot(fingerprint)
+                if snap is not None:
+                    model = model_from_snapshot(snap)
+                    catalog = model.catalog
         except Exception as e:
             print(f"Error loading data for recommender: {e}")
+            return
         finally:
             conn.close()
 
+        if model is None:
+            self._publish(Model(None, None, catalog))
+            print("No books found in DB.")
+            return
+
+        model = self._attach(model)
+        self._publish(model)
+        MODEL_LOAD_SECONDS.observe(time.perf_counter() - start, kind="snapshot" if source else "fit")
+        print(f"Recommender loaded with {len(catalog)} books{source}.")
+        if background_jobs:
+            self._schedule_tables(model)
+        # Books inserted while a refit was reading the table are picked up incrementally
+        if force_refit:
+            self.update_index()
+
+    def update_index(self):
+        """
+        Vectorizes only books added since the last load and publishes the model with them appended.
+        If books the model already indexed were edited or deleted, a full refit is scheduled instead.
+        """
+        current = self.model
+        if current is None or current.vectorizer is None or current.catalog.empty:
+            self.load_data()
+            return 0
+
+        start = time.perf_counter()
+        with self._publish_lock, self._build_lock():
+            current = self.model
+            if self.shared:
+                # Another worker may already have indexed some of the new books
+                current = self._latest_shared(current)
+            conn = get_db_connection()
+            try:
+                # One read transaction: the fingerprint, the edit check and the new rows see the same state
+                conn.execute("BEGIN")
+                fingerprint = snapshot.db_fingerprint(conn)
+                last_id = int(current.catalog.ids[-1])
+                edited = snapshot.edited_since(conn, current.edit_seq, last_id)
+                new_books = None if edited else Catalog.from_db(conn, after_id=last_id)
+            except Exception as e:
+                print(f"Error reading new books for recommender: {e}")
+                return 0
+            finally:
+                conn.close()
+
+            if edited:
+                # Appending cannot revise rows already in the matrix and catalog
+                if current is not self.model:
+                    self._publish(current)
+                print("Recommender: indexed books were edited; scheduling a full refit.")
+                self.schedule_refit()
+                return 0
+
+            if new_books.empty:
+                if current is not self.model:
+                    self._publish(current)
+                return 0
+
+            model = current.appended(new_books, fingerprint[2])
+            # Saved before publishing, so watch_snapshots() never finds an older snapshot than the model
+            self._save_snapshot(model, fingerprint)
+            if self.shared:
+                snap = snapshot.load_snapshot(fingerprint)
+                if snap is not None:
+                    model = self._attach(model_from_snapshot(snap))
+            self._publish(model)
+
+        MODEL_LOAD_SECONDS.observe(time.perf_counter() - start, kind="incremental")
+        self._schedule_tables(model)
+
+        print(f"Recommender indexed {len(new_books)} new books (total {len(model.catalog)}).")
+        if self.needs_refit():
+            self.schedule_refit()
+        return len(new_books)
+
+    def update_saved_model(self):
+        """
+        Outside the API (sync jobs): brings the saved snapshot up to date with the database and waits for
+        the refit or table builds this starts. API processes attach the result via watch_snapshots().
+        Returns the number of books appended.
+        """
+        # File locks and the snapshot hand-off work exactly as between shared-mode workers
+        self.shared = True
+        with self._publish_lock:
+            latest = self._latest_shared(self.model)
+            if latest is not None and latest is not self.model:
+                self._publish(latest)
+        added = self.update_index()
+        # The background threads are daemons; this process must not exit before they finish
+        while True:
+            running = [thread for thread in (self._refit_thread, self._neighbor_thread, self._ann_thread)
+                       if thread is not None and thread.is_alive()]
+            if not running:
+                return added
+            for thread in running:
+                thread.join()
+
+    def needs_refit(self):
+        """True once appended rows or recurring unseen terms make the frozen vocabulary stale."""
+        model = self.model
+        if model is None:
+            return False
+        if model.appended_rows > REFIT_NEW_DOCS_FRACTION * max(model.fitted_rows, 1):
+            return True
+        # Terms seen in a single new book are mostly noise; recurring ones mean a new topic
+        recurring = sum(1 for count in model.oov_terms.values() if count > 1)
+        return recurring >= REFIT_OOV_TERMS
+
+    def schedule_refit(self):
+        """Starts a full refit in a background thread unless one is already running."""
+        if self.refit_running():
+            return False
+        print("Recommender scheduling full refit in the background.")
+        self._refit_thread = threading.Thread(target=self.load_data, kwargs={'force_refit': True}, daemon=True)
+        self._refit_thread.start()
+        return True
+
+    def refit_running(self):
+        return self._refit_thread is not None and self._refit_thread.is_alive()
+
+    def collect_metrics(self):
+        """Refreshes the model and result cache gauges (runs before every /metrics render)."""
+        cache = self.cache.stats()
+        metrics.RESULT_CACHE_REQUESTS.set_total(cache["hits"], result="hit")
+        metrics.RESULT_CACHE_REQUESTS.set_total(cache["misses"], result="miss")
+        metrics.RESULT_CACHE_ENTRIES.set(cache["size"])
+        model = self.model
+        if model is None or model.tfidf_matrix is None:
+            return
+        matrix = model.tfidf_matrix
+        metrics.MODEL_GENERATION.set(model.generation)
+        metrics.MODEL_BOOKS.set(len(model.catalog))
+        metrics.MODEL_APPENDED_BOOKS.set(model.appended_rows)
+        metrics.MODEL_TERMS.set(len(model.vectorizer.vocabulary_))
+        metrics.MODEL_NONZEROS.set(matrix.nnz)
+        parts = {
+            "matrix": (matrix.data, matrix.indices, matrix.indptr),
+            "postings": model.index.to_arrays().values(),
+            "catalog": model.catalog.to_arrays().values(),
+            "lookups": list(model.isbn_index.to_arrays().values()) + list(model.author_index.to_arrays().values()),
+            "ann": model.ann.to_arrays().values() if model.ann is not None else (),
+            "neighbors": (model.neighbors,) if model.neighbors is not None else (),
+        }
+        for part, arrays in parts.items():
+            metrics.MODEL_BYTES.set(sum(a.nbytes for a in arrays), part=part)
+
+    def _save_snapshot(self, model, fingerprint):
+        try:
+            snapshot.save_snapshot(
+                model.vectorizer.get_feature_names_out(), model.vectorizer.idf_, model.tfidf_matrix,
+                model.catalog, fingerprint,
+                stats={
+                    'fit_id': model.fit_id, 'fitted_rows': model.fitted_rows,
+                    'appended_rows': model.appended_rows, 'edit_seq': model.edit_seq,
+                    'oov_terms': dict(model.oov_terms),
+                },
+                index=model.index, isbn_index=model.isbn_index, author_index=model.author_index,
+            )
+        except OSError as e:
+            print(f"Could not save recommender snapshot: {e}")
+            return False
+        return True
+
+    def _prune_edits(self, conn, edit_seq):
+        # Once a refit is saved, the edit log before it is only needed as a horizon marker
+        try:
+            snapshot.prune_edits(conn, edit_seq)
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(f"Could not prune book edits: {e}")
+
+    def _attach_neighbors(self, model):
+        """The model with the saved neighbour table for its fit memory-mapped in, if there is a matching one."""
+        neighbors = None
+        table = snapshot.load_neighbors(model.fit_id)
+        if table is not None:
+            n = len(table['ids'])
+            if n <= len(model.catalog) and np.array_equal(table['ids'], model.catalog.ids[:n]):
+                neighbors = table['neighbors']
+        return model.replace(neighbors=neighbors)
+
+    def _attach_ann(self, model):
+        """The model with the saved ANN index for its fit attached, extended to rows appended since it was built."""
+        if not self.use_ann or model.tfidf_matrix is None:
+            return model
+        index = snapshot.load_ann(model.fit_id, ann.SETTINGS)
+        if index is None:
+            return model
+        return self._with_ann(model, index)
+
+    def _with_ann(self, model, index):
+        n = index.n_rows
+        if n > len(model.catalog) or not np.array_equal(index.ids, model.catalog.ids[:n]):
+            return model
+        if n < len(model.catalog):
+            index = index.extended(model.tfidf_matrix[n:], model.catalog.ids[n:])
+        return model.replace(ann=index)
+
+    def _attach(self, model):
+        return self._attach_ann(self._attach_neighbors(model))
+
+    def _schedule_tables(self, model):
+        # The exact neighbour table costs O(n^2) to build (appended rows only extend it);
+        # in ANN mode /similar is served by the ANN index instead
+        if self.use_ann:
+            if model.ann is None:
+                self.schedule_ann()
+        elif model.neighbors is None or len(model.neighbors) < len(model.catalog):
+            self.schedule_neighbors()
+
+    def build_ann(self):
+        """Fits the ANN index over the current model, saves it and attaches it."""
+        model = self.model
+        if model is None or model.tfidf_matrix is None:
+            return
+        # Shared mode: one worker fits the index and the others attach it from disk
+        with snapshot.file_lock("ann", blocking=False) if self.shared else nullcontext(True) as acquired:
+            if not acquired:
+                return
+            start = time.time()
+            index = ann.ANNIndex.build(model.tfidf_matrix, model.catalog.ids[:model.tfidf_matrix.shape[0]])
+            if index is None:
+                return
+            try:
+                snapshot.save_ann(index, model.fit_id, ann.SETTINGS)
+            except OSError as e:
+                print(f"Could not save ANN index: {e}")
+        with self._publish_lock:
+            current = self.model
+            if current.fit_id == model.fit_id:
+                self.model = self._with_ann(current, index)
+        MODEL_LOAD_SECONDS.observe(time.time() - start, kind="ann")
+        print(f"ANN index built for {index.n_rows} books ({len(index.centroids)} lists) in {time.time() - start:.1f}s.")
+
+    def schedule_ann(self):
+        """Starts building the ANN index in a background thread unless one is already running."""
+        if self._ann_thread is not None and self._ann_thread.is_alive():
+            return False
+        self._ann_thread = threading.Thread(target=self.build_ann, daemon=True)
+        self._ann_thread.start()
+        return True
+
+    def build_neighbors(self, k=NEIGHBOR_K):
+        """
+        Computes and saves the top-K neighbour table for every indexed book. When the saved table
+        covers a prefix of the model (books were appended since), only the new rows are scored.
+        """
+        model = self.model
+        if model is None or model.tfidf_matrix is None:
+            return
+        # Shared mode: one worker computes the table and the others attach it from disk
+        with snapshot.file_lock("neighbors", blocking=False) if self.shared else nullcontext(True) as acquired:
+            if not acquired:
+                return
+            start = time.time()
+            n = model.tfidf_matrix.shape[0]
+            ids = model.catalog.ids[:n]
+            base = snapshot.load_neighbors(model.fit_id)
+            if (base is not None and base['neighbors'].shape[1] == max(0, min(k, n - 1))
+                    and len(base['ids']) <= n and np.array_equal(base['ids'], ids[:len(base['ids'])])):
+                neighbors, scores = extend_neighbors(base['neighbors'], base['scores'], model.tfidf_matrix)
+            else:
+                neighbors, scores = compute_neighbors(model.tfidf_matrix, k=k)
+            try:
+                snapshot.save_neighbors(neighbors, scores, ids, model.fit_id)
+            except OSError as e:
+                print(f"Could not save neighbour table: {e}")
+        with self._publish_lock:
+            # A refit while we were computing makes this table meaningless for the new model
+            current = self.model
+            if current.fit_id == model.fit_id:
+                self.model = current.replace(neighbors=neighbors)
+        MODEL_LOAD_SECONDS.observe(time.time() - start, kind="neighbors")
+        print(f"Neighbour table built for {len(neighbors)} books in {time.time() - start:.1f}s.")
+
+    def schedule_neighbors(self):
+        """Starts building the neighbour table in a background thread unless one is already running."""
+        if self._neighbor_thread is not None and self._neighbor_thread.is_alive():
+            return False
+        self._neighbor_thread = threading.Thread(target=self.build_neighbors, daemon=True)
+        self._neighbor_thread.start()
+        return True
+
+    def _latest_shared(self, current):
+        """The newest snapshot written by any worker as a Model, or `current` if that is already it."""
+        if not snapshot_differs(snapshot.read_meta(), current):
+            return current
+        snap = snapshot.load_snapshot()
+        if snap is None:
+            return current
+        return self._attach(model_from_snapshot(snap))
+
+    def attach_latest(self):
+        """
+        Publishes the snapshot another worker or a sync job wrote if it is not the one being served,
+        and picks up a longer neighbour table for the current fit. Returns True if the model changed.
+        """
+        with self._publish_lock:
+            current = self.model
+            latest = self._latest_shared(current)
+            if latest is not current:
+                self._publish(latest)
+                return True
+            if current is not None and current.tfidf_matrix is not None:
+                known = 0 if current.neighbors is None else len(current.neighbors)
+                if known < len(current.catalog):
+                    model = self._attach_neighbors(current)
+                    if model.neighbors is not None and len(model.neighbors) > known:
+                        self.model = current = model
+                if self.use_ann and current.ann is None:
+                    model = self._attach_ann(current)
+                    if model.ann is not None:
+                        self.model = model
+            return False
+
+    def watch_snapshots(self, interval=SNAPSHOT_POLL_SECONDS):
+        """Starts a background thread that calls attach_latest() every `interval` seconds."""
+        def watch():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.attach_latest()
+                except Exception as e:
+                    print(f"Error attaching shared model: {e}")
+
+        thread = threading.Thread(target=watch, daemon=True)
+        thread.start()
+        return thread
+
     def recommend(self, query, top_n=10):
         """Recommend books based on a natural language query."""
-        if self.vectorizer is None or self.tfidf_matrix is None:
+        model = self.model
+        if model is None or model.vectorizer is None:
             self.load_data()
-            if self.vectorizer is None:
+            model = self.model
+            if model is None or model.vectorizer is None:
                 return []
-        
+        return self._cached(
+            model, ('recommend', normalize_query(query), top_n), lambda: self._recommend(model, query, top_n)
+        )
+
+    def _recommend(self, model, query, top_n):
         try:
-            query_vec = self.vectorizer.transform([query])
-            cosine_sim = cosine_similarity(query_vec, self.tfidf_matrix).flatten()
+            timer = StageTimer(RECOMMENDER_STAGE_SECONDS, "recommend")
+            # Query and documents are L2-normalised, so the posting-list dot product is the cosine
+            query_vec = model.vectorizer.transform([query])
+            timer.stage("transform")
+            if model.ann is not None:
+                doc_ids, scores = model.ann.score(query_vec, model.tfidf_matrix, max(top_n, ann.ANN_CANDIDATES))
+            else:
+                doc_ids, scores = model.index.score(query_vec)
+            timer.stage("score")
             
-            # Get top N indices with non-zero scores
-            top_indices = cosine_sim.argsort()[-top_n:][::-1]
+            # Top N of the documents sharing at least one term (all other scores are zero)
+            top_indices, top_scores = top_k(doc_ids, scores, top_n)
+            timer.stage("top_k")
             
-            results = []
-            for idx in top_indices:
-                if cosine_sim[idx] > 0:
-                    book = self.df.iloc[idx].to_dict()
-                    book['match_score'] = float(cosine_sim[idx])
-                    results.append(book)
+            keep = top_scores > 0
+            results = model.catalog.rows(top_indices[keep])
+            for book, score in zip(results, top_scores[keep]):
+                book['match_score'] = float(score)
+            timer.stage("materialize")
                     
             return results
         except Exception as e:
             print(f"Error generating recommendation: {e}")
-            return []
+            return None
+
+    def recommend_batch(self, queries):
+        """
+        Recommendations for several (query, top_n) pairs, in order, all from the same model.
+        Cached answers are reused; the rest are vectorized together and scored with one sparse product.
+        """
+        model = self.model
+        if model is None or model.vectorizer is None:
+            self.load_data()
+            model = self.model
+            if model is None or model.vectorizer is None:
+                return [[] for _ in queries]
+
+        results = [None] * len(queries)
+        keys, misses = {}, {}
+        for i, (query, top_n) in enumerate(queries):
+            key = (model.generation, 'recommend', normalize_query(query), top_n)
+            keys[i] = key
+            cached = self.cache.get(key)
+            if cached is not None:
+                results[i] = cached
+            else:
+                # Repeated moods in one batch are scored once
+                misses.setdefault(key, []).append(i)
+        if not misses:
+            return results
+
+        computed = self._recommend_many(model, [(queries[ids[0]][0], key[-1]) for key, ids in misses.items()])
+        for (key, ids), books in zip(misses.items(), computed):
+            if books is not None:
+                self.cache.put(key, books)
+            for i in ids:
+                results[i] = books if books is not None else []
+        return results
+
+    def _recommend_many(self, model, queries):
+        try:
+            timer = StageTimer(RECOMMENDER_STAGE_SECONDS, "recommend_batch")
+            query_matrix = model.vectorizer.transform([query for query, _ in queries])
+            timer.stage("transform")
+            if model.ann is None:
+                # Row i holds the cosine of query i with every document sharing one of its terms
+                scores = (query_matrix @ model.tfidf_matrix.T).tocsr()
+                scores.sort_indices()
+                timer.stage("score")
+
+            results = []
+            for i, (_, top_n) in enumerate(queries):
+                if model.ann is not None:
+                    doc_ids, row_scores = model.ann.score(
+                        query_matrix[i], model.tfidf_matrix, max(top_n, ann.ANN_CANDIDATES)
+                    )
+                    timer.stage("score")
+                else:
+                    start, stop = scores.indptr[i], scores.indptr[i + 1]
+                    doc_ids, row_scores = scores.indices[start:stop], scores.data[start:stop]
+                top_indices, top_scores = top_k(doc_ids, row_scores, top_n)
+                timer.stage("top_k")
+                keep = top_scores > 0
+                books = model.catalog.rows(top_indices[keep])
+                for book, score in zip(books, top_scores[keep]):
+                    book['match_score'] = float(score)
+                timer.stage("materialize")
+                results.append(books)
+            return results
+        except Exception as e:
+            print(f"Error generating batch recommendation: {e}")
+            return [None] * len(queries)
 
     def get_similar_books(self, isbn, top_n=5):
         """Find books similar to a specific book given by ISBN."""
-        if self.df is None or self.tfidf_matrix is None:
+        model = self.model
+        if model is None or model.tfidf_matrix is None:
             return []
-            
+        return self._cached(model, ('similar', isbn, top_n), lambda: self._similar_books(model, isbn, top_n))
+
+    def _similar_books(self, model, isbn, top_n):
         try:
             # Find the index of the book
-            idx_list = self.df.index[self.df['isbn'] == isbn].tolist()
-            if not idx_list:
+            idx = model.isbn_index.first(isbn)
+            if idx is None:
                 return []
-            
-            idx = idx_list[0]
-            # Calculate similarity on the fly for this specific book only
+
+            timer = StageTimer(RECOMMENDER_STAGE_SECONDS, "similar")
+            # Precomputed table: O(K) lookup
+            neighbors = model.neighbors
+            if neighbors is not None and idx < len(neighbors) and top_n <= neighbors.shape[1]:
+                row = [i for i in neighbors[idx][:top_n] if i >= 0]
+                timer.stage("table_lookup")
+                results = model.catalog.rows(row)
+                timer.stage("materialize")
+                return results
+
+            if model.ann is not None:
+                doc_ids, scores = model.ann.score(
+                    model.tfidf_matrix[idx], model.tfidf_matrix, max(top_n, ann.ANN_CANDIDATES), exclude=idx
+                )
+                timer.stage("score")
+                top_indices, top_scores = top_k(doc_ids, scores, top_n)
+                timer.stage("top_k")
+                results = model.catalog.rows(top_indices[top_scores > 0])
+                timer.stage("materialize")
+                return results
+
+            # Not in the table yet: calculate similarity on the fly for this specific book only
             # This saves massive amounts of RAM (prevents exit code 137)
-            target_vec = self.tfidf_matrix[idx]
-            sim_scores = cosine_similarity(target_vec, self.tfidf_matrix).flatten()
+            target_vec = model.tfidf_matrix[idx]
+            sim_scores = cosine_similarity(target_vec, model.tfidf_matrix).flatten()
+            timer.stage("score")
             
             # Sort by similarity, skip the first one as it's the book itself
             sim_scores_idx = sim_scores.argsort()
             # Get top N+1 indices (last N+1 elements since argsort is ascending)
             top_indices = sim_scores_idx[-(top_n+1):-1][::-1]
+            timer.stage("top_k")
             
-            results = []
-            for i in top_indices:
-                if sim_scores[i] > 0:
-                    book = self.df.iloc[i].to_dict()
-                    results.append(book)
-                
+            results = model.catalog.rows([i for i in top_indices if sim_scores[i] > 0])
+            timer.stage("materialize")
             return results
         except Exception as e:
             print(f"Error getting similar books: {e}")
-            return []
+            return None
 
     def get_books_by_author(self, author_name, skip_isbn=None, top_n=5):
         """Find more books by the same author."""
-        if self.df is None:
+        model = self.model
+        if model is None:
             return []
-            
+        return self._cached(
+            model,
+            ('author', normalize_author(author_name), skip_isbn, top_n),
+            lambda: self._books_by_author(model, author_name, skip_isbn, top_n),
+        )
+
+    def _books_by_author(self, model, author_name, skip_isbn, top_n):
         try:
-            # Simple substring match for author
-            matches = self.df[self.df['author'].str.contains(author_name, case=False, na=False)]
-            
-            if skip_isbn:
-                matches = matches[matches['isbn'] != skip_isbn]
+            timer = StageTimer(RECOMMENDER_STAGE_SECONDS, "author")
+            # Case- and accent-insensitive match through the author index
+            isbns = model.catalog.column('isbn')
+            matches = []
+            for i in model.author_index.lookup(author_name):
+                if not (skip_isbn and isbns[i] == skip_isbn):
+                    matches.append(i)
+                    if len(matches) >= top_n:
+                        break
+            timer.stage("lookup")
                 
-            results = matches.head(top_n).to_dict('records')
+            results = model.catalog.rows(matches)
+            timer.stage("materialize")
             return results
         except Exception as e:
             print(f"Error getting books by author: {e}")
-            return []
+            return None
 
 # Global instance
 recommender = Recommender()
+metrics.REGISTRY.add_collector(recommender.collect_metrics)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import List, Optional
 
 class BookBase(BaseModel):
     isbn: str
@@ -15,5 +15,34 @@ class Book(BookBase):
     class Config:
         from_attributes = True
 
+class SearchResult(Book):
+    title_highlight: Optional[str] = None
+    snippet: Optional[str] = None
+    score: float
+
 class RecommendationRequest(BaseModel):
     mood: str
+
+class MoodQuery(BaseModel):
+    mood: str
+    top_n: int = Field(10, ge=1, le=100)
+
+class BatchRecommendationRequest(BaseModel):
+    queries: List[MoodQuery]
+
+class SyncJob(BaseModel):
+    id: str
+    status: str
+    limit: int
+    refresh: bool
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    elapsed_seconds: Optional[float] = None
+    processed: int
+    found: int
+    inserted: int
+    checked_per_second: float
+    inserted_per_minute: float
+    new_books_indexed: Optional[int] = None
+    error: Optional[str] = None
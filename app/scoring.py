@@ -0,0 +1,79 @@
+import numpy as np
+
+class InvertedIndex:
+    """Posting lists (CSC columns) of the TF-IDF matrix, used to score only documents sharing a query term."""
+
+    def __init__(self, matrix):
+        csc = matrix.tocsc()
+        csc.sort_indices()
+        self.indptr = csc.indptr
+        self.indices = csc.indices
+        self.data = csc.data
+        self.n_docs = matrix.shape[0]
+
+    @classmethod
+    def from_arrays(cls, indptr, indices, data, n_docs):
+        """Index over already-built posting lists (e.g. memory-mapped from a snapshot)."""
+        index = cls.__new__(cls)
+        index.indptr = indptr
+        index.indices = indices
+        index.data = data
+        index.n_docs = n_docs
+        return index
+
+    def to_arrays(self):
+        return {"indptr": self.indptr, "indices": self.indices, "data": self.data}
+
+    def extended(self, new_matrix):
+        """
+        New index with the rows of `new_matrix` appended as documents n_docs, n_docs + 1, ...
+        Their ids are larger than every existing one, so each merged posting list is the old list
+        followed by the new entries: the arrays are copied once, never re-sorted.
+        """
+        new = new_matrix.tocsc()
+        new.sort_indices()
+        # Each new entry goes at the end of its term's old posting list
+        positions = np.repeat(np.asarray(self.indptr[1:]), np.diff(new.indptr))
+        return InvertedIndex.from_arrays(
+            np.asarray(self.indptr) + new.indptr,
+            np.insert(np.asarray(self.indices), positions, new.indices + self.n_docs),
+            np.insert(np.asarray(self.data), positions, new.data),
+            self.n_docs + new_matrix.shape[0],
+        )
+
+    def score(self, query_vec):
+        """
+        Dot products of one L2-normalised query row against every candidate document.
+        Returns (doc_ids ascending, scores); documents sharing no term are never touched.
+        """
+        query_vec = query_vec.tocsr()
+        terms = query_vec.indices
+        if len(terms) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        starts, stops = self.indptr[terms], self.indptr[terms + 1]
+        docs = np.concatenate([self.indices[a:b] for a, b in zip(starts, stops)])
+        vals = np.concatenate([self.data[a:b] * w for a, b, w in zip(starts, stops, query_vec.data)])
+        if len(docs) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        doc_ids, inverse = np.unique(docs, return_inverse=True)
+        scores = np.bincount(inverse, weights=vals, minlength=len(doc_ids))
+        return doc_ids, scores
+
+def top_k(doc_ids, scores, k):
+    """
+    Best k (doc_id, score) pairs, highest first, using partial selection.
+    Tied scores come back larger doc id first (doc_ids ascending): the order of
+    np.argsort(scores, kind='stable')[-k:][::-1] over the same arrays. The full-sort code this replaced
+    used the default unstable argsort, so tied results may be ordered differently than it ordered them.
+    """
+    if k <= 0 or len(scores) == 0:
+        return doc_ids[:0], scores[:0]
+    if len(scores) > k:
+        # Keep everything tied with the k-th best so tie-breaking stays identical to a full sort
+        threshold = np.partition(scores, len(scores) - k)[len(scores) - k]
+        keep = scores >= threshold
+        doc_ids, scores = doc_ids[keep], scores[keep]
+    order = np.argsort(scores, kind='stable')[-k:][::-1]
+    return doc_ids[order], scores[order]
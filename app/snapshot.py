@@ -0,0 +1,252 @@
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+from scipy import sparse
+from app.catalog import Catalog, ARRAY_NAMES as CATALOG_ARRAYS
+from app.scoring import InvertedIndex
+from app.keyindex import KeyIndex, ARRAY_NAMES as KEY_ARRAYS
+from app.author_index import AuthorIndex, ARRAY_NAMES as AUTHOR_ARRAYS
+from app import ann
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process deployments only, file locks become no-ops
+    fcntl = None
+
+# Fitted model artifacts live next to books.db so Docker volumes keep them across redeploys
+SNAPSHOT_DIR = os.environ.get("BOOKFINDER_MODEL_DIR", "model_cache")
+SNAPSHOT_VERSION = 4
+
+MODEL_ARRAYS = ("terms", "idf", "data", "indices", "indptr", "post_indptr", "post_indices", "post_data")
+
+def last_edit(conn):
+    """Sequence number of the latest UPDATE or DELETE on books (see book_edits in app/database.py)."""
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'book_edits'").fetchone()
+    return int(row[0]) if row is not None else 0
+
+def edited_since(conn, edit_seq, max_id):
+    """
+    True if a book with id <= max_id was updated or deleted after edit `edit_seq`, or if edits after
+    `edit_seq` have been pruned (the model predates the latest refit and cannot tell).
+    """
+    row = conn.execute(
+        "SELECT 1 FROM book_edits WHERE seq > ? AND (book_id <= ? OR book_id IS NULL) LIMIT 1", (edit_seq, max_id)
+    ).fetchone()
+    return row is not None
+
+def prune_edits(conn, edit_seq):
+    """
+    Deletes the edits a full refit up to `edit_seq` already reflects, leaving one marker row at that
+    sequence number so models fitted before it still see that they are stale.
+    """
+    if not edit_seq:
+        return
+    conn.execute("DELETE FROM book_edits WHERE seq <= ?", (edit_seq,))
+    conn.execute("INSERT INTO book_edits (seq, book_id) VALUES (?, NULL)", (edit_seq,))
+    conn.commit()
+
+def db_fingerprint(conn):
+    """Cheap signature of the books table (row count, max id, latest edit)."""
+    row = conn.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM books").fetchone()
+    return [int(row[0]), int(row[1]), last_edit(conn)]
+
+def _snapshot_path(directory=None):
+    return os.path.join(directory or SNAPSHOT_DIR, f"v{SNAPSHOT_VERSION}")
+
+_write_lock = threading.Lock()
+
+@contextmanager
+def file_lock(name, blocking=True, directory=None, shared=False):
+    """
+    Lock shared by every process using the model directory (uvicorn workers, builders): exclusive,
+    or with shared=True one that any number of holders take together.
+    Yields False instead of waiting when blocking=False and another process holds it.
+    """
+    directory = directory or SNAPSHOT_DIR
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f"{name}.lock"), "a") as f:
+        if fcntl is None:
+            yield True
+            return
+        try:
+            fcntl.flock(f, (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _current_version(target):
+    """Directory name of the published version of `target` (written to its .current pointer), or None."""
+    try:
+        with open(target + ".current") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def _remove_stale(target, current):
+    """Deletes every version of `target` but `current`, unless a reader is opening one right now."""
+    directory, base = os.path.split(target)
+    with file_lock(f"{base}.read", blocking=False, directory=directory) as acquired:
+        if not acquired:
+            # The next save cleans up instead
+            return
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.startswith(base + ".") and name != current and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+def _write_arrays(target, arrays, meta):
+    # Background rebuilds, incremental updates and other worker processes may save at the same time
+    directory, base = os.path.split(target)
+    with _write_lock, file_lock("write", directory=directory):
+        # Every save gets a directory of its own; replacing the pointer file publishes it atomically,
+        # so readers see the previous version or this one and never a mix of both
+        version = f"{base}.{time.time_ns()}"
+        path = os.path.join(directory, version)
+        os.makedirs(path)
+        for name, arr in arrays.items():
+            np.save(os.path.join(path, f"{name}.npy"), arr)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        with open(target + ".current.tmp", "w") as f:
+            f.write(version)
+        os.replace(target + ".current.tmp", target + ".current")
+        _remove_stale(target, version)
+
+def _read_arrays(target, names):
+    directory, base = os.path.split(target)
+    try:
+        # Held while the files are opened, so the version is not deleted underneath; the memory maps
+        # stay valid after the lock is released even if it is
+        with file_lock(f"{base}.read", directory=directory, shared=True):
+            version = _current_version(target)
+            if version is None:
+                return None, None
+            path = os.path.join(directory, version)
+            with open(os.path.join(path, "meta.json")) as f:
+                meta = json.load(f)
+            if meta.get("version") != SNAPSHOT_VERSION:
+                return None, None
+            arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in names}
+    except (OSError, ValueError):
+        return None, None
+    return meta, arrays
+
+def save_snapshot(terms, idf, matrix, catalog, fingerprint, stats=None, directory=None, index=None,
+                  isbn_index=None, author_index=None):
+    """
+    Writes the fitted vocabulary, IDF weights, CSR arrays, posting lists, the serving catalog
+    and its ISBN and author lookups to disk.
+    """
+    matrix = sparse.csr_matrix(matrix)
+    if index is None:
+        index = InvertedIndex(matrix)
+    arrays = {
+        "terms": np.asarray(terms, dtype=str),
+        "idf": np.asarray(idf, dtype=np.float64),
+        "data": matrix.data,
+        "indices": matrix.indices,
+        "indptr": matrix.indptr,
+    }
+    arrays.update({f"post_{name}": arr for name, arr in index.to_arrays().items()})
+    arrays.update({f"catalog_{name}": arr for name, arr in catalog.to_arrays().items()})
+    if isbn_index is None:
+        isbn_index = KeyIndex.build(*catalog.isbn_rows())
+    if author_index is None:
+        author_index = AuthorIndex.build(catalog.column("author").values())
+    arrays.update({f"isbn_{name}": arr for name, arr in isbn_index.to_arrays().items()})
+    arrays.update({f"author_{name}": arr for name, arr in author_index.to_arrays().items()})
+    meta = {
+        "version": SNAPSHOT_VERSION,
+        "fingerprint": list(fingerprint),
+        "shape": list(matrix.shape),
+        "stats": stats or {},
+    }
+    _write_arrays(_snapshot_path(directory), arrays, meta)
+
+def load_snapshot(fingerprint=None, directory=None):
+    """Memory-maps a saved snapshot. Returns None if missing, outdated or stale."""
+    names = (
+        MODEL_ARRAYS + tuple(f"catalog_{name}" for name in CATALOG_ARRAYS)
+        + tuple(f"isbn_{name}" for name in KEY_ARRAYS) + tuple(f"author_{name}" for name in AUTHOR_ARRAYS)
+    )
+    meta, arrays = _read_arrays(_snapshot_path(directory), names)
+    if meta is None:
+        return None
+    if fingerprint is not None and meta.get("fingerprint") != list(fingerprint):
+        return None
+
+    matrix = sparse.csr_matrix(
+        (arrays["data"], arrays["indices"], arrays["indptr"]),
+        shape=tuple(meta["shape"]),
+        copy=False,
+    )
+    return {
+        "terms": arrays["terms"],
+        "idf": arrays["idf"],
+        "matrix": matrix,
+        "index": InvertedIndex.from_arrays(
+            arrays["post_indptr"], arrays["post_indices"], arrays["post_data"], matrix.shape[0]
+        ),
+        "catalog": Catalog.from_arrays({name: arrays[f"catalog_{name}"] for name in CATALOG_ARRAYS}),
+        "isbn_index": KeyIndex.from_arrays({name: arrays[f"isbn_{name}"] for name in KEY_ARRAYS}),
+        "author_index": AuthorIndex.from_arrays({name: arrays[f"author_{name}"] for name in AUTHOR_ARRAYS}),
+        "fingerprint": meta["fingerprint"],
+        "stats": meta.get("stats", {}),
+    }
+
+def read_meta(directory=None):
+    """meta.json of the current snapshot (fingerprint, shape, stats), or None."""
+    target = _snapshot_path(directory)
+    version = _current_version(target)
+    if version is None:
+        return None
+    try:
+        with open(os.path.join(os.path.dirname(target), version, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        # Replaced and deleted since the pointer was read; the next poll sees the new one
+        return None
+    return meta if meta.get("version") == SNAPSHOT_VERSION else None
+
+def _neighbors_path(directory=None):
+    return os.path.join(directory or SNAPSHOT_DIR, f"neighbors_v{SNAPSHOT_VERSION}")
+
+def save_neighbors(neighbors, scores, ids, fit_id, directory=None):
+    """Writes the precomputed top-K neighbour table for the rows in `ids`."""
+    arrays = {
+        "neighbors": np.asarray(neighbors, dtype=np.int32),
+        "scores": np.asarray(scores, dtype=np.float32),
+        "ids": np.asarray(ids, dtype=np.int64),
+    }
+    meta = {"version": SNAPSHOT_VERSION, "fit_id": fit_id, "k": int(arrays["neighbors"].shape[1])}
+    _write_arrays(_neighbors_path(directory), arrays, meta)
+
+def load_neighbors(fit_id, directory=None):
+    """Memory-maps the neighbour table if it was built from the model fit `fit_id`."""
+    meta, arrays = _read_arrays(_neighbors_path(directory), ("neighbors", "scores", "ids"))
+    if meta is None or meta.get("fit_id") != fit_id:
+        return None
+    return arrays
+
+def _ann_path(directory=None):
+    return os.path.join(directory or SNAPSHOT_DIR, f"ann_v{SNAPSHOT_VERSION}")
+
+def save_ann(index, fit_id, settings, directory=None):
+    """Writes the ANN index (SVD components, IVF centroids and lists, quantized vectors) for the fit `fit_id`."""
+    meta = {"version": SNAPSHOT_VERSION, "fit_id": fit_id, "settings": settings}
+    _write_arrays(_ann_path(directory), index.to_arrays(), meta)
+
+def load_ann(fit_id, settings, directory=None):
+    """Memory-maps the saved ANN index if it was built from the fit `fit_id` with these settings."""
+    meta, arrays = _read_arrays(_ann_path(directory), ann.ARRAY_NAMES)
+    if meta is None or meta.get("fit_id") != fit_id or meta.get("settings") != settings:
+        return None
+    return ann.ANNIndex.from_arrays(arrays)
@@ -0,0 +1,130 @@
+import asyncio
+import itertools
+import json
+import urllib.parse
+import aiohttp
+from scripts import http_cache
+from scripts.endpoints import GOOGLE_BOOKS_HOST, OPENLIBRARY_HOST, record_fetch
+
+# Concurrent requests allowed per API host (keep-alive connections are pooled per host too)
+HOST_LIMITS = {
+    GOOGLE_BOOKS_HOST: 40,
+    OPENLIBRARY_HOST: 60,
+}
+DEFAULT_HOST_LIMIT = 20
+# Jobs pulled from the (blocking) job iterator per step
+JOB_CHUNK = 100
+
+class AsyncFetcher:
+    """One keep-alive aiohttp session shared by every lookup, with a concurrency cap per host."""
+
+    def __init__(self, host_limits=None, retries=2):
+        self.host_limits = dict(HOST_LIMITS if host_limits is None else host_limits)
+        self.retries = retries
+        self._semaphores = {}
+        self.session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(
+            limit=sum(self.host_limits.values()) + DEFAULT_HOST_LIMIT,
+            limit_per_host=max(self.host_limits.values(), default=DEFAULT_HOST_LIMIT),
+            ttl_dns_cache=300,
+            keepalive_timeout=30,
+        )
+        self.session = aiohttp.ClientSession(connector=connector)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    def _semaphore(self, url):
+        host = urllib.parse.urlsplit(url).hostname
+        sem = self._semaphores.get(host)
+        if sem is None:
+            sem = asyncio.Semaphore(self.host_limits.get(host, DEFAULT_HOST_LIMIT))
+            self._semaphores[host] = sem
+        return sem
+
+    async def get_json(self, url, timeout=5):
+        """
+        Same retry policy as ingest.get_with_retry: decoded JSON, or None if every attempt failed.
+        A 200 response that is not JSON raises ValueError, like ingest.get_json.
+        The cache is SQLite: its reads and writes run in worker threads, off the event loop.
+        """
+        cached = await asyncio.to_thread(http_cache.cache.lookup, url)
+        if cached is not None:
+            record_fetch(url, "cached")
+            return cached.json() if cached.ok else None
+        status = None
+        for i in range(self.retries + 1):
+            try:
+                async with self._semaphore(url):
+                    async with self.session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+                        status = resp.status
+                        if status == 200:
+                            text = await resp.text()
+                if status == 200:
+                    record_fetch(url, "ok")
+                    data = json.loads(text)
+                    await asyncio.to_thread(http_cache.cache.store, url, 200, text)
+                    return data
+                if status == 429:
+                    record_fetch(url, "rate_limited")
+                    await asyncio.sleep(2 * (i + 1)) # Wait longer for rate limits
+                else:
+                    record_fetch(url, "http_error")
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                record_fetch(url, "error")
+                if i < self.retries:
+                    await asyncio.sleep(1)
+        await asyncio.to_thread(http_cache.cache.store, url, status)
+        return None
+
+async def drive(fetcher, steps):
+    """Runs one lookup_steps() generator to completion against the async fetcher."""
+    try:
+        request = next(steps)
+        while True:
+            try:
+                data = await fetcher.get_json(*request)
+            except ValueError as e:
+                request = steps.throw(e)
+            else:
+                request = steps.send(data)
+    except StopIteration as done:
+        return done.value
+
+async def _run(jobs, make_steps, on_result, concurrency, host_limits):
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+
+    async with AsyncFetcher(host_limits) as fetcher:
+        async def worker():
+            while True:
+                job = await queue.get()
+                if job is None:
+                    return
+                try:
+                    res = await drive(fetcher, make_steps(job))
+                except Exception:
+                    res = None
+                on_result(job, res)
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        # The job iterator may block (CSV reads, batched bibkeys requests), so it is advanced off the loop
+        jobs = iter(jobs)
+        while True:
+            chunk = await asyncio.to_thread(lambda: list(itertools.islice(jobs, JOB_CHUNK)))
+            if not chunk:
+                break
+            for job in chunk:
+                await queue.put(job)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+
+def run_lookups(jobs, make_steps, on_result, concurrency=500, host_limits=None):
+    """
+    Runs make_steps(job) for every job on one event loop with up to `concurrency` lookups in flight.
+    on_result(job, record) is called on the loop thread as each lookup finishes.
+    """
+    asyncio.run(_run(jobs, make_steps, on_result, concurrency, host_limits))
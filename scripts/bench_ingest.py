@@ -0,0 +1,166 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_ROOT)
+
+from app import database
+from scripts.fake_books_api import start_server, add_config_arguments, config_from_args
+from scripts.synthetic_catalog import CatalogGenerator, PLACEHOLDER, INSERT_SQL
+
+def write_csv(path, rows, seed=0):
+    """A cleaned_books.csv with `rows` synthetic books (ISBN, Title, Author/Editor, Year)."""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        out = csv.writer(f)
+        out.writerow(["ISBN", "Title", "Author/Editor", "Year"])
+        for isbn, title, _, author, _, year in CatalogGenerator(seed).rows(rows):
+            out.writerow([isbn, title, author, year])
+
+def _use_fake_api(port, workdir, cache):
+    # Set before the ingestion modules are imported: endpoints and the HTTP cache read them at import time
+    os.environ["BOOKFINDER_OPENLIBRARY_URL"] = f"http://127.0.0.1:{port}"
+    # A second host name for the same server, so per-host limits see two APIs as in production
+    os.environ["BOOKFINDER_GOOGLE_BOOKS_URL"] = f"http://localhost:{port}"
+    os.environ["BOOKFINDER_HTTP_CACHE"] = os.path.join(workdir, "http_cache.db") if cache else "off"
+    os.chdir(workdir)
+    database.DB_NAME = os.path.join(workdir, "books.db")
+
+def run_ingest(port, workdir, rows, engine, threads, concurrency, cache):
+    """Child process: ingest_data over the CSV in `workdir` against the fake API."""
+    _use_fake_api(port, workdir, cache)
+    from scripts.ingest import ingest_data
+    return ingest_data(limit=rows, threads=threads, engine=engine, concurrency=concurrency)
+
+def run_enrich(port, workdir, workers, rps, cache):
+    """Child process: enrich_books over the placeholder books in `workdir`'s books.db."""
+    _use_fake_api(port, workdir, cache)
+    from scripts import enrich_metadata
+    if rps:
+        enrich_metadata.limiter = enrich_metadata.RateLimiter(
+            {host: (rps, max(1, int(rps))) for host in enrich_metadata.SOURCE_RATES}, default=(rps, max(1, int(rps)))
+        )
+    start = time.perf_counter()
+    counts = enrich_metadata.enrich_books(workers=workers, restart=True, checkpoint_path="enrich_checkpoint.json")
+    counts["elapsed_seconds"] = time.perf_counter() - start
+    return counts
+
+def _in_child(fn, *args):
+    # A fresh process per phase: the fake server keeps this one's GIL, and module-level settings start clean
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(fn, *args).result()
+
+def _per_minute(count, seconds):
+    return count / seconds * 60 if seconds else 0.0
+
+def bench_ingest(server, workdir, rows, engine, threads, concurrency, cache):
+    write_csv(os.path.join(workdir, "cleaned_books.csv"), rows)
+    server.reset_stats()
+    counts = _in_child(run_ingest, server.port, workdir, rows, engine, threads, concurrency, cache)
+    api = server.stats()
+    elapsed = counts["elapsed_seconds"]
+    return {
+        "engine": engine,
+        "threads": threads if engine == "threads" else None,
+        "concurrency": concurrency if engine == "async" else None,
+        "rows": rows,
+        "processed": counts["processed"],
+        "inserted": counts["inserted"],
+        "elapsed_seconds": elapsed,
+        "books_checked_per_minute": _per_minute(counts["processed"], elapsed),
+        "books_inserted_per_minute": _per_minute(counts["inserted"], elapsed),
+        "requests": api["requests"],
+        "requests_per_book": api["requests"] / counts["processed"] if counts["processed"] else 0.0,
+        "requests_per_inserted_book": api["requests"] / counts["inserted"] if counts["inserted"] else None,
+        "db_write_rows_per_second": counts["write_rows_per_second"],
+        "db_commits": counts["commits"],
+        "api": api,
+    }
+
+def bench_enrich(server, workdir, rows, workers, rps, cache):
+    path = os.path.join(workdir, "books.db")
+    conn = sqlite3.connect(path)
+    # Placeholder copies of the CSV books under new ISBNs, so enrichment has `rows` books to fill in
+    conn.executemany(INSERT_SQL, (
+        (f"E{isbn}", title, PLACEHOLDER, author, cover, year)
+        for isbn, title, _, author, cover, year in CatalogGenerator(seed=1).rows(rows)
+    ))
+    conn.commit()
+    conn.close()
+    server.reset_stats()
+    counts = _in_child(run_enrich, server.port, workdir, workers, rps, cache)
+    api = server.stats()
+    elapsed = counts["elapsed_seconds"]
+    return {
+        "workers": workers,
+        "rate_override_rps": rps,
+        "rows": rows,
+        "updated": counts["updated"],
+        "found": counts["found"],
+        "elapsed_seconds": elapsed,
+        "books_per_minute": _per_minute(counts["updated"], elapsed),
+        "requests": api["requests"],
+        "requests_per_book": api["requests"] / counts["updated"] if counts["updated"] else 0.0,
+        "requests_per_found_book": api["requests"] / counts["found"] if counts["found"] else None,
+        "api": api,
+    }
+
+def print_phase(name, result):
+    print(f"\n{name}:")
+    for key, value in result.items():
+        if key == "api":
+            print(f"  requests by route: {value['by_route']}")
+            print(f"  responses by status: {value['by_status']}")
+        elif isinstance(value, float):
+            print(f"  {key}: {value:.2f}")
+        else:
+            print(f"  {key}: {value}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark ingest.py (and optionally enrich_metadata.py) against a local fake books API."
+    )
+    parser.add_argument("--rows", type=int, default=500, help="CSV rows to ingest")
+    parser.add_argument("--engine", choices=["async", "threads"], default="async")
+    parser.add_argument("--threads", type=int, default=65)
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--enrich", type=int, default=0, help="Also enrich this many placeholder books")
+    parser.add_argument("--workers", type=int, default=8, help="enrich_metadata.py worker threads")
+    parser.add_argument("--enrich-rps", type=float, default=0.0,
+                        help="Replace enrich_metadata.py's per-API rate limits with this rate (0: keep them)")
+    parser.add_argument("--cache", action="store_true", help="Use a (fresh) HTTP response cache, as production runs do")
+    parser.add_argument("--out", help="Write the JSON report here")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    config = config_from_args(args)
+    server = start_server(config)
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cache": args.cache,
+            "fake_api": config.to_dict(),
+        },
+    }
+    with tempfile.TemporaryDirectory(prefix="bench_ingest_") as workdir:
+        report["ingest"] = bench_ingest(server, workdir, args.rows, args.engine, args.threads, args.concurrency, args.cache)
+        print_phase("ingest", report["ingest"])
+        if args.enrich:
+            report["enrich"] = bench_enrich(server, workdir, args.enrich, args.workers, args.enrich_rps, args.cache)
+            print_phase("enrich", report["enrich"])
+    server.shutdown()
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.out}")
@@ -0,0 +1,261 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not reported
+    resource = None
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_ROOT)
+
+from scripts.synthetic_catalog import ensure_catalog
+
+DEFAULT_SIZES = (1000, 10000)
+# Calls timed per operation (after WARMUP_CALLS untimed ones)
+SAMPLES = 200
+WARMUP_CALLS = 5
+# --compare flags a metric as a regression when it is this fraction slower than the baseline...
+REGRESSION_THRESHOLD = 0.25
+# ...and slower by more than this many ms: sub-millisecond latencies and one-shot load timings are noisy
+REGRESSION_MIN_MS = 0.2
+REGRESSION_MIN_LOAD_MS = 100
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def summarize(samples_ms):
+    samples = np.asarray(samples_ms)
+    return {
+        "n": len(samples),
+        "mean_ms": float(samples.mean()),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p90_ms": float(np.percentile(samples, 90)),
+        "p99_ms": float(np.percentile(samples, 99)),
+        "max_ms": float(samples.max()),
+    }
+
+def measure(fn, inputs):
+    """Latency summary of fn(x) over `inputs` (the first WARMUP_CALLS inputs are run untimed first)."""
+    for x in inputs[:WARMUP_CALLS]:
+        fn(x)
+    timings = []
+    for x in inputs:
+        start = time.perf_counter()
+        fn(x)
+        timings.append((time.perf_counter() - start) * 1000)
+    return summarize(timings)
+
+def _workload(model, samples, seed):
+    """Moods of 2 to 4 vocabulary terms, plus ISBNs, authors and ids of random books."""
+    rng = np.random.default_rng(seed)
+    terms = model.vectorizer.get_feature_names_out()
+    moods = [" ".join(rng.choice(terms, rng.integers(2, 5))) for _ in range(samples)]
+    rows = rng.choice(len(model.catalog), samples)
+    isbns = model.catalog.column('isbn').take(rows)
+    authors = [a or "" for a in model.catalog.column('author').take(rows)]
+    ids = [int(model.catalog.ids[i]) for i in rows]
+    return moods, isbns, authors, ids
+
+def run_size(rows, data_dir, seed, samples, http, neighbors, ann):
+    """Benchmarks one catalog size; runs in its own process so peak RSS belongs to this size alone."""
+    os.chdir(REPO_ROOT)
+    path = ensure_catalog(data_dir, rows, seed)
+
+    from app import database, snapshot
+    database.DB_NAME = path
+    snapshot.SNAPSHOT_DIR = tempfile.mkdtemp(prefix="bench_model_")
+    try:
+        return _run_size(rows, samples, seed, http, neighbors, ann)
+    finally:
+        shutil.rmtree(snapshot.SNAPSHOT_DIR, ignore_errors=True)
+
+def _run_size(rows, samples, seed, http, neighbors, ann):
+    from app import recommender as recommender_module
+    from app.recommender import Recommender
+    result = {"rows": rows, "load": {}, "memory": {"baseline_rss_mb": peak_rss_mb()}, "recommender": {}}
+
+    # Cold: fit + snapshot write; warm: memory-map the snapshot as a restart would
+    rec = Recommender()
+    rec.use_ann = ann
+    start = time.perf_counter()
+    rec.load_data(background_jobs=False)
+    result["load"]["fit_seconds"] = time.perf_counter() - start
+    result["memory"]["after_fit_rss_mb"] = peak_rss_mb()
+    warm = Recommender()
+    start = time.perf_counter()
+    warm.load_data(background_jobs=False)
+    result["load"]["snapshot_load_seconds"] = time.perf_counter() - start
+    del warm
+    if ann:
+        start = time.perf_counter()
+        rec.build_ann()
+        result["load"]["ann_build_seconds"] = time.perf_counter() - start
+    if neighbors:
+        start = time.perf_counter()
+        rec.build_neighbors()
+        result["load"]["neighbors_seconds"] = time.perf_counter() - start
+
+    model = rec.model
+    moods, isbns, authors, ids = _workload(model, samples, seed)
+
+    def uncached(fn):
+        def call(x):
+            rec.cache.clear()
+            return fn(x)
+        return call
+
+    bench = result["recommender"]
+    bench["recommend"] = measure(uncached(lambda q: rec.recommend(q)), moods)
+    # Same mood every call: the result cache hit path
+    bench["recommend_cached"] = measure(lambda q: rec.recommend(moods[0]), moods)
+    bench["recommend_batch_per_mood"] = measure(
+        uncached(lambda qs: rec.recommend_batch([(q, 10) for q in qs])), [moods[i:i + 20] for i in range(0, samples, 20)]
+    )
+    per_mood = bench["recommend_batch_per_mood"]
+    for key in ("mean_ms", "p50_ms", "p90_ms", "p99_ms", "max_ms"):
+        per_mood[key] /= 20
+    bench["similar"] = measure(uncached(lambda isbn: rec.get_similar_books(isbn)), isbns)
+    bench["author"] = measure(uncached(lambda name: rec.get_books_by_author(name)), authors)
+
+    if http:
+        from fastapi.testclient import TestClient
+        from app.main import app
+        recommender_module.recommender = rec
+        client = TestClient(app)
+
+        def get(url):
+            response = client.get(url)
+            response.raise_for_status()
+
+        def post(url, body):
+            response = client.post(url, json=body)
+            response.raise_for_status()
+
+        result["api"] = {
+            "POST /recommend": measure(uncached(lambda q: post("/recommend", {"mood": q})), moods),
+            "GET /books/{isbn}/similar": measure(uncached(lambda isbn: get(f"/books/{isbn}/similar")), isbns),
+            "GET /books/author/{name}": measure(uncached(lambda name: get(f"/books/author/{name}")), authors),
+            "GET /books": measure(lambda book_id: get(f"/books?limit=100&after_id={book_id}"), ids),
+        }
+
+    result["memory"]["peak_rss_mb"] = peak_rss_mb()
+    result["model"] = {
+        "books": len(model.catalog),
+        "terms": len(model.vectorizer.vocabulary_),
+        "nnz": int(model.tfidf_matrix.nnz),
+        "ann": model.ann is not None,
+    }
+    return result
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(sizes, data_dir, seed=0, samples=SAMPLES, http=True, neighbors=False, ann=False):
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": seed,
+            "samples": samples,
+            "neighbors": neighbors,
+            "ann": ann,
+        },
+        "sizes": {},
+    }
+    context = multiprocessing.get_context("spawn")
+    for rows in sizes:
+        print(f"Benchmarking {rows} books...")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            result = pool.submit(run_size, rows, data_dir, seed, samples, http, neighbors, ann).result()
+        report["sizes"][str(rows)] = result
+    return report
+
+def _timings(report):
+    """Flattens a report to {metric path: (milliseconds, noise floor)} for the values compared between runs."""
+    metrics = {}
+    for rows, result in report["sizes"].items():
+        for name, seconds in result["load"].items():
+            metrics[f"{rows}/load/{name}"] = (seconds * 1000, REGRESSION_MIN_LOAD_MS)
+        for group in ("recommender", "api"):
+            for op, summary in result.get(group, {}).items():
+                # Tail latency of a few hundred calls swings too much to gate on; p50 and mean do not
+                for key in ("p50_ms", "mean_ms"):
+                    metrics[f"{rows}/{group}/{op}/{key}"] = (summary[key], REGRESSION_MIN_MS)
+    return metrics
+
+def compare(report, baseline, threshold=REGRESSION_THRESHOLD):
+    """Metrics that got slower than the baseline by more than `threshold` and their noise floor: [(name, old, new)]."""
+    old, new = _timings(baseline), _timings(report)
+    regressions = []
+    for name in sorted(old.keys() & new.keys()):
+        (before, _), (after, floor) = old[name], new[name]
+        if after > before * (1 + threshold) and after - before > floor:
+            regressions.append((name, before, after))
+    return regressions
+
+def print_report(report):
+    for rows, result in report["sizes"].items():
+        load = ", ".join(f"{k} {v:.2f}s" for k, v in result["load"].items())
+        print(f"\n{rows} books: {load}, peak RSS {result['memory']['peak_rss_mb'] or 0:.0f} MB")
+        print(f"  {'operation':<36} {'p50 ms':>9} {'p99 ms':>9} {'mean ms':>9}")
+        for group in ("recommender", "api"):
+            for op, s in result.get(group, {}).items():
+                print(f"  {group + ' ' + op:<36} {s['p50_ms']:>9.3f} {s['p99_ms']:>9.3f} {s['mean_ms']:>9.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark model load and query latency on synthetic catalogs (e.g. --sizes 1000 10000 100000 1000000)."
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--samples", type=int, default=SAMPLES, help="Timed calls per operation")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default="bench_data", help="Where generated catalogs are cached")
+    parser.add_argument("--no-http", action="store_true", help="Skip the in-process FastAPI measurements")
+    parser.add_argument("--neighbors", action="store_true", help="Build the /similar neighbour table before timing")
+    parser.add_argument("--ann", action="store_true", help="Build and use the ANN index (app/ann.py)")
+    parser.add_argument("--out", help="Write the JSON report here")
+    parser.add_argument("--compare", help="Baseline JSON report; exit with status 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    report = run(
+        args.sizes, os.path.abspath(args.data_dir), args.seed, args.samples,
+        http=not args.no_http, neighbors=args.neighbors, ann=args.ann,
+    )
+    print_report(report)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.out}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.compare}:")
+            for name, old, new in regressions:
+                print(f"  {name}: {old:.3f} -> {new:.3f} ms ({new / old - 1:+.0%})")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.compare}.")
@@ -0,0 +1,70 @@
+import itertools
+import json
+from scripts import http_cache
+from scripts.endpoints import OPENLIBRARY_API_BASE
+
+# ISBNs resolved per api/books request (the endpoint takes a comma-separated bibkeys list)
+BIBKEYS_BATCH = 100
+
+def has_isbn(isbn):
+    return bool(isbn) and not str(isbn).startswith("N/A")
+
+def isbn_url(isbn):
+    """The single-ISBN request the lookup waterfalls make."""
+    return f"{OPENLIBRARY_API_BASE}?bibkeys=ISBN:{isbn}&jscmd=details&format=json"
+
+def batch_url(isbns):
+    return f"{OPENLIBRARY_API_BASE}?bibkeys={','.join(f'ISBN:{i}' for i in isbns)}&jscmd=details&format=json"
+
+def split_response(data, isbns):
+    """Per-ISBN payloads, each exactly what isbn_url(isbn) would have returned ({} when not found)."""
+    results = {}
+    for isbn in isbns:
+        key = f"ISBN:{isbn}"
+        results[isbn] = {key: data[key]} if isinstance(data, dict) and key in data else {}
+    return results
+
+def resolve(isbns, fetch):
+    """
+    OpenLibrary records for a group of ISBNs with at most one request per BIBKEYS_BATCH of them.
+    Entries already in the HTTP cache are used as they are; each fetched record is cached under its
+    single-ISBN URL. ISBNs whose batch request failed are missing from the result.
+    """
+    results, missing = {}, []
+    for isbn in dict.fromkeys(isbns):
+        cached = http_cache.cache.lookup(isbn_url(isbn))
+        if cached is not None and cached.ok:
+            try:
+                results[isbn] = cached.json()
+                continue
+            except ValueError:
+                pass
+        missing.append(isbn)
+
+    for start in range(0, len(missing), BIBKEYS_BATCH):
+        group = missing[start:start + BIBKEYS_BATCH]
+        try:
+            data = fetch(batch_url(group))
+        except ValueError:
+            data = None
+        if data is None:
+            continue
+        for isbn, payload in split_response(data, group).items():
+            http_cache.cache.store(isbn_url(isbn), 200, json.dumps(payload))
+            results[isbn] = payload
+    return results
+
+def with_bibkeys(rows, isbn_of, fetch, batch_size=BIBKEYS_BATCH):
+    """
+    Pairs each row with its OpenLibrary record, resolved batch_size rows at a time:
+    yields (row, payload) where payload is None if it could not be fetched in bulk
+    (the waterfall then falls back to the single-ISBN request).
+    """
+    rows = iter(rows)
+    while True:
+        group = list(itertools.islice(rows, batch_size))
+        if not group:
+            return
+        resolved = resolve([isbn_of(r) for r in group if has_isbn(isbn_of(r))], fetch)
+        for row in group:
+            yield row, resolved.get(isbn_of(row))
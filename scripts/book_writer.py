@@ -0,0 +1,143 @@
+import queue
+import sqlite3
+import threading
+import time
+from app.database import pool
+from app.metrics import INGEST_BOOKS, INGEST_INSERT_RATE, INGEST_WRITE_RATE
+
+BOOK_COLUMNS = ("isbn", "title", "description", "author", "cover_image", "publish_year")
+INSERT_SQL = (
+    f"INSERT INTO books ({', '.join(BOOK_COLUMNS)}) VALUES ({', '.join('?' * len(BOOK_COLUMNS))}) "
+    "ON CONFLICT DO NOTHING"
+)
+# A batch is written once it has this many rows, or its oldest row has waited this long
+FLUSH_ROWS = 500
+FLUSH_SECONDS = 1.0
+# Commits tried per batch (one flush interval apart) before its rows are given up as unwritten
+MAX_FLUSH_ATTEMPTS = 10
+
+_STOP = object()
+
+class WriteError(Exception):
+    """Found books that the writer could not insert (see BookWriter.stats()['unwritten'])."""
+
+class BookWriter(threading.Thread):
+    """
+    The only thread that writes found books during ingestion.
+    Lookups hand records to put(); the writer inserts them in large transactions on one connection,
+    so the fetch workers never compete for the SQLite write lock and each batch costs a single commit.
+    """
+
+    def __init__(self, flush_rows=FLUSH_ROWS, flush_seconds=FLUSH_SECONDS, max_attempts=MAX_FLUSH_ATTEMPTS, log=print):
+        super().__init__(name="book-writer", daemon=True)
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.max_attempts = max_attempts
+        self.log = log
+        self._queue = queue.Queue()
+        self.written = 0
+        self.duplicates = 0
+        # Rows given up after max_attempts failed commits, and the last error
+        self.unwritten = 0
+        self.error = None
+        self.batches = 0
+        self.write_seconds = 0.0
+        self.started_at = None
+
+    def put(self, record):
+        """Queues one book (a tuple in BOOK_COLUMNS order). Safe to call from any thread or the event loop."""
+        self._queue.put(record)
+
+    def close(self):
+        """
+        Writes whatever is still queued, stops the thread and returns stats().
+        Callers check stats()['unwritten']: rows the database kept refusing are dropped, not raised here.
+        """
+        self._queue.put(_STOP)
+        self.join()
+        return self.stats()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def run(self):
+        self.started_at = time.time()
+        conn = pool.connection()
+        pending = []
+        deadline = None
+        attempts = 0
+        try:
+            while True:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+                if item is _STOP:
+                    break
+                if item is not None:
+                    if not pending:
+                        deadline = time.monotonic() + self.flush_seconds
+                    pending.append(item)
+                if len(pending) >= self.flush_rows or (pending and time.monotonic() >= deadline):
+                    attempts += 1
+                    if self._flush(conn, pending) or self._give_up(pending, attempts):
+                        pending, deadline, attempts = [], None, 0
+                    else:
+                        # Database busy: keep the rows and try again after another interval
+                        deadline = time.monotonic() + self.flush_seconds
+            while pending:
+                attempts += 1
+                if self._flush(conn, pending) or self._give_up(pending, attempts):
+                    break
+                time.sleep(self.flush_seconds)
+        finally:
+            pool.discard()
+
+    def _flush(self, conn, rows):
+        start = time.perf_counter()
+        try:
+            cursor = conn.executemany(INSERT_SQL, rows)
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            self.error = e
+            self.log(f"  ⚠️ Writer could not commit {len(rows)} rows ({e}); will retry.")
+            return False
+        self.write_seconds += time.perf_counter() - start
+        self.batches += 1
+        self.written += cursor.rowcount
+        self.duplicates += len(rows) - cursor.rowcount
+
+        stats = self.stats()
+        INGEST_BOOKS.inc(cursor.rowcount, stage="inserted")
+        INGEST_INSERT_RATE.set(stats['rows_per_minute'] / 60)
+        INGEST_WRITE_RATE.set(stats['write_rows_per_second'])
+        self.log(
+            f"  ✨ Added {cursor.rowcount} (Total: {self.written}) | Speed: {stats['rows_per_minute']:.1f}/min"
+            f" | Writer: {stats['write_rows_per_second']:.0f} rows/s in {self.batches} commits"
+        )
+        return True
+
+    def _give_up(self, rows, attempts):
+        """True (and the rows counted as unwritten) once a batch has used all its attempts."""
+        if attempts < self.max_attempts:
+            return False
+        self.unwritten += len(rows)
+        self.log(f"  ❌ Writer gave up on {len(rows)} rows after {attempts} failed commits ({self.error}).")
+        return True
+
+    def stats(self):
+        elapsed = time.time() - self.started_at if self.started_at else 0.0
+        return {
+            "written": self.written,
+            "duplicates": self.duplicates,
+            "unwritten": self.unwritten,
+            "batches": self.batches,
+            "rows_per_minute": self.written / elapsed * 60 if elapsed else 0.0,
+            "write_rows_per_second": self.written / self.write_seconds if self.write_seconds else 0.0,
+        }
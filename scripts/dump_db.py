@@ -1,11 +1,27 @@
 import sqlite3
-import pandas as pd
 import os
 import sys
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.export import FORMATS, export_books, iter_batches
+
 # Ensure we can find the DB
 DB_PATH = "books.db"
 
+PREVIEW_COLUMNS = ("id", "isbn", "title", "substr(description, 1, 50) as desc_preview", "publish_year")
+# Fixed column widths, so rows can be printed as they are read instead of after loading the whole table
+PREVIEW_WIDTHS = (6, 13, 40, 50, 12)
+PREVIEW_HEADERS = ("id", "isbn", "title", "desc_preview", "publish_year")
+
+def format_row(values):
+    cells = []
+    for value, width in zip(values, PREVIEW_WIDTHS):
+        text = "" if value is None else " ".join(str(value).split())
+        if len(text) > width:
+            text = text[:width - 1] + "…"
+        cells.append(text.ljust(width))
+    return " ".join(cells).rstrip()
+
 def show_all_data():
     if not os.path.exists(DB_PATH):
         print("Database not found.")
@@ -13,15 +29,17 @@ def show_all_data():
 
     conn = sqlite3.connect(DB_PATH)
     try:
-        # Read into pandas dataframe for nice printing
-        df = pd.read_sql_query("SELECT id, isbn, title, substr(description, 1, 50) as desc_preview, publish_year FROM books", conn)
-        
-        if df.empty:
+        total = conn.execute("SELECT COUNT(*) FROM books").fetchone()[0]
+
+        if total == 0:
             print("Database is empty.")
         else:
-            print(f"Total Books: {len(df)}")
+            print(f"Total Books: {total}")
             print("-" * 80)
-            print(df.to_string(index=False))
+            print(format_row(PREVIEW_HEADERS))
+            for rows in iter_batches(conn, columns=PREVIEW_COLUMNS):
+                for row in rows:
+                    print(format_row(row))
             print("-" * 80)
     except Exception as e:
         print(f"Error reading database: {e}")
@@ -29,4 +47,14 @@ def show_all_data():
         conn.close()
 
 if __name__ == "__main__":
-    show_all_data()
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--export", metavar="PATH", help="write the table to PATH instead of printing it")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--incremental", action="store_true", help="only rows added since the last export to PATH")
+    args = parser.parse_args()
+    if args.export:
+        count = export_books(args.export, fmt=args.format, incremental=args.incremental)
+        print(f"Exported {count} books to {args.export}")
+    else:
+        show_all_data()
@@ -0,0 +1,32 @@
+import os
+import urllib.parse
+from app.metrics import INGEST_FETCHES
+
+# Where the lookups go. Point these at scripts/fake_books_api.py to run ingestion without the live APIs
+OPENLIBRARY_URL = os.environ.get("BOOKFINDER_OPENLIBRARY_URL", "https://openlibrary.org").rstrip("/")
+GOOGLE_BOOKS_URL = os.environ.get("BOOKFINDER_GOOGLE_BOOKS_URL", "https://www.googleapis.com").rstrip("/")
+
+OPENLIBRARY_API_BASE = f"{OPENLIBRARY_URL}/api/books"
+OPENLIBRARY_SEARCH = f"{OPENLIBRARY_URL}/search.json"
+GOOGLE_BOOKS_VOLUMES = f"{GOOGLE_BOOKS_URL}/books/v1/volumes"
+
+# Hosts that per-API rate limits and connection caps are keyed by
+OPENLIBRARY_HOST = urllib.parse.urlsplit(OPENLIBRARY_URL).hostname
+GOOGLE_BOOKS_HOST = urllib.parse.urlsplit(GOOGLE_BOOKS_URL).hostname
+
+def work_url(work_key):
+    """JSON record of an OpenLibrary work key such as /works/OL45883W."""
+    return f"{OPENLIBRARY_URL}{work_key}.json"
+
+def source_of(url):
+    """'openlibrary', 'google', or the host name of any other URL (the metrics' source label)."""
+    host = urllib.parse.urlsplit(url).hostname
+    if host == OPENLIBRARY_HOST:
+        return "openlibrary"
+    if host == GOOGLE_BOOKS_HOST:
+        return "google"
+    return host
+
+def record_fetch(url, outcome):
+    """Counts one request attempt (or cache answer) in the ingestion metrics."""
+    INGEST_FETCHES.inc(source=source_of(url), outcome=outcome)
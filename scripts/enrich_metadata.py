@@ -1,16 +1,83 @@
 import sqlite3
-import requests
+import json
 import re
+import threading
 import time
 import urllib.parse
 import sys
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 # Ensure import app modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app.database import get_db_connection
+from scripts.bibkeys import with_bibkeys
+from scripts.http_cache import cached_get
+from scripts.endpoints import (
+    OPENLIBRARY_API_BASE, OPENLIBRARY_SEARCH, GOOGLE_BOOKS_VOLUMES, OPENLIBRARY_HOST, GOOGLE_BOOKS_HOST, work_url,
+)
 
-OPENLIBRARY_API_BASE = "https://openlibrary.org/api/books"
+# Requests per second (and burst size) allowed to each API, instead of a global sleep between books
+SOURCE_RATES = {
+    OPENLIBRARY_HOST: (3.0, 5),
+    GOOGLE_BOOKS_HOST: (1.0, 3),
+}
+DEFAULT_RATE = (1.0, 1)
+DEFAULT_WORKERS = 8
+# Updates are committed in batches of this many books, together with the checkpoint
+UPDATE_BATCH = 50
+CHECKPOINT_PATH = "enrich_checkpoint.json"
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, with bursts of up to `burst`."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+class RateLimiter:
+    """One token bucket per API host."""
+
+    def __init__(self, rates=SOURCE_RATES, default=DEFAULT_RATE):
+        self.default = default
+        self.buckets = {host: TokenBucket(*rate) for host, rate in rates.items()}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        host = urllib.parse.urlsplit(url).hostname
+        with self._lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = self.buckets[host] = TokenBucket(*self.default)
+        bucket.acquire()
+
+limiter = RateLimiter()
+print_lock = threading.Lock()
+
+def safe_print(msg):
+    # Lookups run on worker threads; keep their lines from interleaving
+    with print_lock:
+        print(msg)
+
+def rate_limited_get(url, timeout=5):
+    """cached_get that waits for the host's rate limit before going to the network (cache hits are free)."""
+    return cached_get(url, timeout=timeout, before_fetch=limiter.wait)
 
 def clean_description(desc):
     if not desc:
@@ -25,23 +92,27 @@ def clean_description(desc):
 
 def fetch_work_details(work_key):
     if not work_key: return None
-    url = f"https://openlibrary.org{work_key}.json"
+    url = work_url(work_key)
     try:
-        response = requests.get(url, timeout=5)
+        response = rate_limited_get(url, timeout=5)
         if response.status_code == 200:
             return response.json()
     except:
         pass
     return None
 
-def fetch_details(isbn, title):
-    # 1. Try ISBN
+def fetch_json(url, timeout=10):
+    """Decoded JSON of a rate-limited GET, or None unless it returned 200."""
+    response = rate_limited_get(url, timeout=timeout)
+    return response.json() if response.status_code == 200 else None
+
+def fetch_details(isbn, title, bibkeys_data=None):
+    # 1. Try ISBN (bibkeys_data: this ISBN's record, when it was already resolved in a batch)
     if isbn and not isbn.startswith("N/A"):
         url = f"{OPENLIBRARY_API_BASE}?bibkeys=ISBN:{isbn}&jscmd=details&format=json"
         try:
-            response = requests.get(url, timeout=5)
-            if response.status_code == 200:
-                data = response.json()
+            data = bibkeys_data if bibkeys_data is not None else fetch_json(url, timeout=5)
+            if data is not None:
                 key = f"ISBN:{isbn}"
                 if key in data:
                     details = data[key]
@@ -54,26 +125,26 @@ def fetch_details(isbn, title):
                            if 'title' not in details and 'title' in w_details: details['title'] = w_details['title']
                     return details
         except Exception as e:
-            print(f"Error ISBN {isbn}: {e}")
+            safe_print(f"Error ISBN {isbn}: {e}")
 
     # 2. Try Title search fallback
     try:
         encoded_title = urllib.parse.quote(title)
-        url = f"https://openlibrary.org/search.json?title={encoded_title}&limit=1"
-        response = requests.get(url, timeout=5)
+        url = f"{OPENLIBRARY_SEARCH}?title={encoded_title}&limit=1"
+        response = rate_limited_get(url, timeout=5)
         if response.status_code == 200:
             data = response.json()
             if data.get('docs'):
-                return fetch_work_details(olid)
+                return fetch_work_details(data['docs'][0].get('key'))
     except Exception as e:
-        print(f"Error Title {title}: {e}")
+        safe_print(f"Error Title {title}: {e}")
 
     # 3. Google Books Fallback (The "Power" Move)
     if isbn and not isbn.startswith("N/A"):
         try:
              # Try Google Books
-             g_url = f"https://www.googleapis.com/books/v1/volumes?q=isbn:{isbn}"
-             g_resp = requests.get(g_url, timeout=5)
+             g_url = f"{GOOGLE_BOOKS_VOLUMES}?q=isbn:{isbn}"
+             g_resp = rate_limited_get(g_url, timeout=5)
              if g_resp.status_code == 200:
                  g_data = g_resp.json()
                  if 'items' in g_data:
@@ -82,64 +153,145 @@ def fetch_details(isbn, title):
                      if description:
                          return {'description': description, 'title': info.get('title'), 'covers': []}
         except Exception as e:
-            print(f"Error GoogleBooks {isbn}: {e}")
+            safe_print(f"Error GoogleBooks {isbn}: {e}")
             
     return None
 
-def enrich_books():
+def read_checkpoint(path=CHECKPOINT_PATH):
+    """Highest book id below which every placeholder book was already processed (0 to start over)."""
+    try:
+        with open(path) as f:
+            return int(json.load(f)["last_id"])
+    except (OSError, ValueError, KeyError):
+        return 0
+
+def write_checkpoint(last_id, path=CHECKPOINT_PATH):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"last_id": last_id}, f)
+    os.replace(tmp, path)
+
+def iter_placeholder_books(conn, after_id, page_size=500):
+    """Books with placeholder descriptions in id order, read a page at a time."""
+    while True:
+        rows = conn.execute(
+            "SELECT id, isbn, title FROM books WHERE description LIKE 'Description%' AND id > ? ORDER BY id LIMIT ?",
+            (after_id, page_size),
+        ).fetchall()
+        if not rows:
+            return
+        for row in rows:
+            yield row
+        after_id = rows[-1]['id']
+
+def enrich_book(row, bibkeys_data=None):
+    """Looks one book up; returns (book_id, new_desc, new_cover)."""
+    details = fetch_details(row['isbn'], row['title'], bibkeys_data)
+
+    new_desc = "Description unavailable."
+    new_cover = None
+
+    if details:
+        clean = clean_description(details.get('description'))
+        if clean:
+            new_desc = clean
+
+        if 'covers' in details and details['covers']:
+             new_cover = f"https://covers.openlibrary.org/b/id/{details['covers'][0]}-M.jpg"
+        elif 'cover' in details:
+             new_cover = details['cover'].get('medium', '')
+
+    return row['id'], new_desc, new_cover
+
+def enrich_books(workers=DEFAULT_WORKERS, restart=False, checkpoint_path=CHECKPOINT_PATH):
     conn = get_db_connection()
-    cursor = conn.cursor()
-    
+
     # Select books with placeholder descriptions
     # We also re-try "No description found" (Description unavailable.) because we have a new source now
-    cursor.execute("SELECT id, isbn, title FROM books WHERE description LIKE 'Description%'")
-    books_to_update = cursor.fetchall()
-    
-    print(f"Found {len(books_to_update)} books needing descriptions.")
-    
+    start_id = 0 if restart else read_checkpoint(checkpoint_path)
+    total = conn.execute(
+        "SELECT COUNT(*) FROM books WHERE description LIKE 'Description%' AND id > ?", (start_id,)
+    ).fetchone()[0]
+
+    if start_id:
+        print(f"Resuming after book id {start_id}: {total} books still need descriptions.")
+    else:
+        print(f"Found {total} books needing descriptions.")
+
     updated_count = 0
-    
-    for row in books_to_update:
-        book_id = row['id']
-        isbn = row['isbn']
-        title = row['title']
-        
-        print(f"Enriching ({updated_count+1}/{len(books_to_update)}): {title[:40]}...")
-        
-        details = fetch_details(isbn, title)
-        
-        new_desc = "Description unavailable."
-        new_cover = None
-        
-        if details:
-            clean = clean_description(details.get('description'))
-            if clean:
-                new_desc = clean
-            
-            if 'covers' in details and details['covers']:
-                 new_cover = f"https://covers.openlibrary.org/b/id/{details['covers'][0]}-M.jpg"
-            elif 'cover' in details:
-                 new_cover = details['cover'].get('medium', '')
-        
-        # Update DB
+    found_count = 0
+    pending_updates = []
+    # Ids in submission order; the checkpoint only moves past ids whose results are committed
+    in_order = deque()
+    finished = set()
+    checkpoint = start_id
+
+    def flush():
+        nonlocal checkpoint
+        with_cover = [(d, c, i) for i, d, c in pending_updates if c]
+        without_cover = [(d, i) for i, d, c in pending_updates if not c]
         try:
-            if new_cover:
-                cursor.execute("UPDATE books SET description = ?, cover_image = ? WHERE id = ?", (new_desc, new_cover, book_id))
-            else:
-                 cursor.execute("UPDATE books SET description = ? WHERE id = ?", (new_desc, book_id))
+            conn.executemany("UPDATE books SET description = ?, cover_image = ? WHERE id = ?", with_cover)
+            conn.executemany("UPDATE books SET description = ? WHERE id = ?", without_cover)
             conn.commit()
-            if new_desc != "Description unavailable.":
-                print(f"  -> SUCCESS! Added description.")
-            else:
-                print(f"  -> No description found.")
-        except Exception as e:
-            print(f"  -> DB Error: {e}")
+        except sqlite3.Error as e:
+            conn.rollback()
+            safe_print(f"  -> DB Error: {e}")
+            return
+        pending_updates.clear()
+        while in_order and in_order[0] in finished:
+            checkpoint = in_order.popleft()
+            finished.discard(checkpoint)
+        write_checkpoint(checkpoint, checkpoint_path)
+
+    # OpenLibrary ISBN records are resolved 100 per request; only misses go on to the per-book fallbacks
+    books = with_bibkeys(iter_placeholder_books(conn, start_id), lambda r: r['isbn'], fetch_json)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {}
+
+            def submit_more():
+                for row, bibkeys_data in books:
+                    futures[executor.submit(enrich_book, row, bibkeys_data)] = row
+                    in_order.append(row['id'])
+                    if len(futures) >= workers * 2:
+                        return
 
-        updated_count += 1
-        time.sleep(1.0) # Be nice to API
-        
-    conn.close()
-    print("Enrichment complete.")
+            submit_more()
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    row = futures.pop(future)
+                    try:
+                        book_id, new_desc, new_cover = future.result()
+                    except Exception as e:
+                        safe_print(f"  -> Error {row['isbn']}: {e}")
+                        book_id, new_desc, new_cover = row['id'], "Description unavailable.", None
+                    updated_count += 1
+                    pending_updates.append((book_id, new_desc, new_cover))
+                    finished.add(book_id)
+                    if new_desc != "Description unavailable.":
+                        found_count += 1
+                        safe_print(f"Enriched ({updated_count}/{total}): {row['title'][:40]} -> SUCCESS! Added description.")
+                    else:
+                        safe_print(f"Enriched ({updated_count}/{total}): {row['title'][:40]} -> No description found.")
+                if len(pending_updates) >= UPDATE_BATCH:
+                    flush()
+                submit_more()
+    finally:
+        # Commit whatever finished, also on Ctrl+C, so a rerun resumes right after it
+        flush()
+        conn.close()
+    if not pending_updates and not in_order:
+        # Full pass done: the next run starts from the beginning (and retries "Description unavailable.")
+        write_checkpoint(0, checkpoint_path)
+    print(f"Enrichment complete. Found {found_count} new descriptions for {updated_count} books.")
+    return {"updated": updated_count, "found": found_count}
 
 if __name__ == "__main__":
-    enrich_books()
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start from the first book")
+    args = parser.parse_args()
+    enrich_books(workers=args.workers, restart=args.restart)
@@ -0,0 +1,122 @@
+import csv
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.database import db_connection
+
+# Same columns and order as SELECT * FROM books
+EXPORT_COLUMNS = ("id", "isbn", "title", "description", "author", "cover_image", "publish_year")
+# Rows fetched from the cursor (and written out) per step; memory use is bounded by this, not the table size
+EXPORT_BATCH_ROWS = 5000
+FORMATS = ("csv", "parquet", "arrow")
+
+def iter_batches(conn, columns=EXPORT_COLUMNS, after_id=0, batch_rows=EXPORT_BATCH_ROWS):
+    """
+    Lists of up to batch_rows tuples from books in id order, starting after `after_id`.
+    `columns` are SQL expressions; the first one must be id.
+    """
+    cursor = conn.execute(
+        f"SELECT {', '.join(columns)} FROM books WHERE id > ? ORDER BY id", (after_id,)
+    )
+    while True:
+        rows = cursor.fetchmany(batch_rows)
+        if not rows:
+            return
+        yield [tuple(row) for row in rows]
+
+def watermark_path(path):
+    return f"{path}.watermark"
+
+def read_watermark(path):
+    """Highest books.id written by the last export to `path` (0 if there was none)."""
+    try:
+        with open(watermark_path(path)) as f:
+            return int(json.load(f)["last_id"])
+    except (OSError, ValueError, KeyError):
+        return 0
+
+def write_watermark(path, last_id):
+    tmp = watermark_path(path) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"last_id": last_id}, f)
+    os.replace(tmp, watermark_path(path))
+
+def _csv_sink(path, append):
+    header = not (append and os.path.exists(path) and os.path.getsize(path) > 0)
+    f = open(path, "a" if append else "w", newline="", encoding="utf-8")
+    writer = csv.writer(f, lineterminator="\n")
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+
+    def write(rows):
+        writer.writerows(rows)
+
+    return write, f.close
+
+def _arrow_sink(path, fmt):
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise RuntimeError(f"{fmt} export needs pyarrow (pip install pyarrow)")
+    schema = pa.schema([
+        ("id", pa.int64()), ("isbn", pa.string()), ("title", pa.string()), ("description", pa.string()),
+        ("author", pa.string()), ("cover_image", pa.string()), ("publish_year", pa.int64()),
+    ])
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(path, schema)
+    else:
+        writer = pa.ipc.new_file(path, schema)
+
+    def write(rows):
+        # One row group / record batch per cursor batch
+        columns = list(zip(*rows))
+        writer.write_table(pa.Table.from_arrays(
+            [pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema
+        ))
+
+    return write, writer.close
+
+def export_books(path, fmt="csv", incremental=False, batch_rows=EXPORT_BATCH_ROWS):
+    """
+    Streams the books table to `path` and returns the number of rows written.
+
+    incremental=True only exports rows with an id above the watermark left by the previous export
+    to the same path: CSV output is appended to the existing file, Parquet/Arrow output holds just
+    the new rows (those formats cannot be appended to). Rows updated in place keep their id and are
+    not picked up again.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r} (expected one of {', '.join(FORMATS)})")
+    after_id = read_watermark(path) if incremental else 0
+    written, last_id = 0, after_id
+
+    with db_connection() as conn:
+        batches = iter_batches(conn, after_id=after_id, batch_rows=batch_rows)
+        if fmt == "csv":
+            write, close = _csv_sink(path, append=incremental)
+        else:
+            write, close = _arrow_sink(path, fmt)
+        try:
+            for rows in batches:
+                write(rows)
+                written += len(rows)
+                last_id = rows[-1][0]
+        finally:
+            close()
+
+    write_watermark(path, last_id)
+    return written
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Export the books table without loading it into memory.")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--incremental", action="store_true", help="only rows added since the last export to PATH")
+    parser.add_argument("--batch-rows", type=int, default=EXPORT_BATCH_ROWS)
+    args = parser.parse_args()
+    count = export_books(args.path, fmt=args.format, incremental=args.incremental, batch_rows=args.batch_rows)
+    print(f"Exported {count} books to {args.path}")
@@ -0,0 +1,280 @@
+import hashlib
+import json
+import random
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Defaults roughly matching what the live APIs answer for the cleaned CSV
+LATENCY_MS = 120
+ISBN_HIT_RATE = 0.6          # ISBNs OpenLibrary knows
+DESCRIPTION_RATE = 0.4       # ...whose edition record carries a description
+WORK_DESCRIPTION_RATE = 0.5  # Works with a description
+SEARCH_HIT_RATE = 0.5        # Titles found by search.json
+GOOGLE_HIT_RATE = 0.45       # Google Books queries with at least one item
+GOOGLE_DESCRIPTION_RATE = 0.7
+# Requests that never answer in time sleep this long (longer than any client timeout in the scripts)
+HANG_SECONDS = 6.0
+
+_WORDS = (
+    "journey secret family river night kingdom letters winter memory island war garden city silence "
+    "promise shadow ocean mountain history friendship empire stranger summer dream truth courage"
+).split()
+
+def _fraction(*key):
+    """Deterministic value in [0, 1) per key, so every run sees the same hits and misses."""
+    digest = hashlib.sha1(":".join(map(str, key)).encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big") / 2 ** 32
+
+def _text(*key, words=60):
+    rng = random.Random(":".join(map(str, key)))
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+def _work_key(seed):
+    return f"/works/OL{int(_fraction('work', seed) * 10 ** 8)}W"
+
+class FakeConfig:
+    """
+    Behaviour of the fake server.
+    Failures are injected in this order: a `timeout_rate` share of requests hang for `hang_seconds`;
+    during a rate-limit burst (the first `rate_limit_seconds` of every `rate_limit_every` seconds), or
+    above `max_rps` requests per second, requests get 429; everything else waits `latency_ms` (log-normal
+    jitter) and is answered from the hit rates.
+    """
+
+    def __init__(self, latency_ms=LATENCY_MS, jitter=0.5, isbn_hit_rate=ISBN_HIT_RATE,
+                 description_rate=DESCRIPTION_RATE, work_description_rate=WORK_DESCRIPTION_RATE,
+                 search_hit_rate=SEARCH_HIT_RATE, google_hit_rate=GOOGLE_HIT_RATE,
+                 google_description_rate=GOOGLE_DESCRIPTION_RATE, rate_limit_every=0.0, rate_limit_seconds=0.0,
+                 max_rps=0.0, timeout_rate=0.0, hang_seconds=HANG_SECONDS, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.isbn_hit_rate = isbn_hit_rate
+        self.description_rate = description_rate
+        self.work_description_rate = work_description_rate
+        self.search_hit_rate = search_hit_rate
+        self.google_hit_rate = google_hit_rate
+        self.google_description_rate = google_description_rate
+        self.rate_limit_every = rate_limit_every
+        self.rate_limit_seconds = rate_limit_seconds
+        self.max_rps = max_rps
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+        self.seed = seed
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+class FakeBooksAPI(ThreadingHTTPServer):
+    """
+    Local stand-in for the OpenLibrary (api/books, works/*.json, search.json) and Google Books (volumes)
+    endpoints the ingestion scripts call, with request counters per route and status.
+    """
+
+    daemon_threads = True
+    # The async engine opens hundreds of connections at once
+    request_queue_size = 1024
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        super().__init__((host, port), _Handler)
+        self.config = config or FakeConfig()
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._rng = random.Random(self.config.seed)
+        self._tokens = self.config.max_rps
+        self._refilled = self.started
+        self.requests = Counter()
+        self.statuses = Counter()
+        self.injected = Counter()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests.clear()
+            self.statuses.clear()
+            self.injected.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": sum(self.requests.values()),
+                "by_route": dict(self.requests),
+                "by_status": {str(k): v for k, v in self.statuses.items()},
+                "injected": dict(self.injected),
+            }
+
+    def _fault(self):
+        """'timeout', 429, or None for a request arriving now; also draws its latency."""
+        config = self.config
+        with self._lock:
+            now = time.monotonic()
+            if config.timeout_rate and self._rng.random() < config.timeout_rate:
+                return "timeout", 0.0
+            if config.rate_limit_every and (now - self.started) % config.rate_limit_every < config.rate_limit_seconds:
+                return 429, 0.0
+            if config.max_rps:
+                self._tokens = min(config.max_rps, self._tokens + (now - self._refilled) * config.max_rps)
+                self._refilled = now
+                if self._tokens < 1:
+                    return 429, 0.0
+                self._tokens -= 1
+            latency = config.latency_ms / 1000 * self._rng.lognormvariate(0, config.jitter) if config.latency_ms else 0.0
+        return None, latency
+
+    def _record(self, route, status, fault=None):
+        with self._lock:
+            self.requests[route] += 1
+            self.statuses[status] += 1
+            if fault is not None:
+                self.injected[str(fault)] += 1
+
+    # Responses (deterministic per ISBN / title / work)
+
+    def books(self, query):
+        config = self.config
+        result = {}
+        for bibkey in query.get("bibkeys", [""])[0].split(","):
+            isbn = bibkey.partition(":")[2]
+            if not isbn or _fraction(config.seed, "isbn", isbn) >= config.isbn_hit_rate:
+                continue
+            details = {
+                "title": _text(config.seed, "title", isbn, words=3).rstrip(".").title(),
+                "authors": [{"name": "Fake Author"}],
+                "works": [{"key": _work_key(isbn)}],
+                "covers": [int(_fraction(config.seed, "cover", isbn) * 10 ** 7)],
+                "publish_date": "2001",
+            }
+            if _fraction(config.seed, "isbn-description", isbn) < config.description_rate:
+                details["description"] = _text(config.seed, "edition", isbn)
+            result[bibkey] = {"bib_key": bibkey, "info_url": f"/books/{isbn}", "details": details}
+        return result
+
+    def work(self, key):
+        config = self.config
+        work = {"key": key, "title": _text(config.seed, "work-title", key, words=3).rstrip(".").title()}
+        if _fraction(config.seed, "work-description", key) < config.work_description_rate:
+            work["description"] = {"type": "/type/text", "value": _text(config.seed, "work", key)}
+        return work
+
+    def search(self, query):
+        config = self.config
+        title = query.get("title", [""])[0]
+        limit = int(query.get("limit", ["10"])[0])
+        if _fraction(config.seed, "search", title) >= config.search_hit_rate:
+            return {"numFound": 0, "start": 0, "docs": []}
+        docs = [{"key": _work_key(f"{title}:{i}"), "title": title} for i in range(limit)]
+        return {"numFound": len(docs), "start": 0, "docs": docs}
+
+    def volumes(self, query):
+        config = self.config
+        q = query.get("q", [""])[0]
+        limit = int(query.get("maxResults", ["10"])[0])
+        if _fraction(config.seed, "google", q) >= config.google_hit_rate:
+            return {"kind": "books#volumes", "totalItems": 0}
+        items = []
+        for i in range(limit):
+            info = {"title": _text(config.seed, "google-title", q, i, words=3).rstrip(".").title()}
+            if _fraction(config.seed, "google-description", q, i) < config.google_description_rate:
+                info["description"] = _text(config.seed, "google", q, i)
+                info["imageLinks"] = {"thumbnail": f"http://books.google.com/books/content?id={i}&printsec=frontcover"}
+            items.append({"kind": "books#volume", "volumeInfo": info})
+        return {"kind": "books#volumes", "totalItems": len(items), "items": items}
+
+class _Handler(BaseHTTPRequestHandler):
+    # Keep-alive, as the real APIs allow (the async engine pools connections)
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=None):
+        payload = json.dumps(body if body is not None else {"error": status}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        server = self.server
+        parts = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(parts.query)
+        path = urllib.parse.unquote(parts.path)
+
+        if path == "/__stats":
+            self._send(200, server.stats())
+            return
+        if path == "/api/books":
+            route, respond = "api/books", lambda: server.books(query)
+        elif path.startswith("/works/") and path.endswith(".json"):
+            route, respond = "works", lambda: server.work(path[:-len(".json")])
+        elif path == "/search.json":
+            route, respond = "search.json", lambda: server.search(query)
+        elif path == "/books/v1/volumes":
+            route, respond = "volumes", lambda: server.volumes(query)
+        else:
+            server._record("unknown", 404)
+            self._send(404)
+            return
+
+        fault, latency = server._fault()
+        if fault == "timeout":
+            server._record(route, "timeout", fault)
+            time.sleep(server.config.hang_seconds)
+            # The client gave up long ago; close instead of answering
+            self.close_connection = True
+            return
+        if fault == 429:
+            server._record(route, 429, fault)
+            self._send(429)
+            return
+        time.sleep(latency)
+        server._record(route, 200)
+        self._send(200, respond())
+
+def start_server(config=None, host="127.0.0.1", port=0):
+    """Starts a FakeBooksAPI on a background thread and returns it (port=0 picks a free port)."""
+    server = FakeBooksAPI(config, host, port)
+    threading.Thread(target=server.serve_forever, name="fake-books-api", daemon=True).start()
+    return server
+
+def add_config_arguments(parser):
+    parser.add_argument("--latency-ms", type=float, default=LATENCY_MS, help="Median response time")
+    parser.add_argument("--jitter", type=float, default=0.5, help="Log-normal sigma of the response time")
+    parser.add_argument("--isbn-hit-rate", type=float, default=ISBN_HIT_RATE)
+    parser.add_argument("--description-rate", type=float, default=DESCRIPTION_RATE)
+    parser.add_argument("--work-description-rate", type=float, default=WORK_DESCRIPTION_RATE)
+    parser.add_argument("--search-hit-rate", type=float, default=SEARCH_HIT_RATE)
+    parser.add_argument("--google-hit-rate", type=float, default=GOOGLE_HIT_RATE)
+    parser.add_argument("--google-description-rate", type=float, default=GOOGLE_DESCRIPTION_RATE)
+    parser.add_argument("--rate-limit-every", type=float, default=0.0, help="Seconds between 429 bursts (0: none)")
+    parser.add_argument("--rate-limit-seconds", type=float, default=0.0, help="Length of each 429 burst")
+    parser.add_argument("--max-rps", type=float, default=0.0, help="429 above this many requests per second (0: no limit)")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Share of requests that never answer in time")
+    parser.add_argument("--hang-seconds", type=float, default=HANG_SECONDS)
+    parser.add_argument("--seed", type=int, default=0)
+
+def config_from_args(args):
+    return FakeConfig(**{name: getattr(args, name) for name in FakeConfig().to_dict()})
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Fake OpenLibrary / Google Books API for local ingestion runs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeBooksAPI(config_from_args(args), args.host, args.port)
+    print(f"Fake books API on http://{args.host}:{server.port} (stats at /__stats)")
+    print(f"  export BOOKFINDER_OPENLIBRARY_URL=http://{args.host}:{server.port}")
+    print(f"  export BOOKFINDER_GOOGLE_BOOKS_URL=http://localhost:{server.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+import zlib
+import requests
+
+# Side database shared by ingest.py and enrich_metadata.py; set BOOKFINDER_HTTP_CACHE=off to disable
+CACHE_PATH = os.environ.get("BOOKFINDER_HTTP_CACHE", "http_cache.db")
+
+POSITIVE_TTL = 30 * 24 * 3600   # Responses with data
+NEGATIVE_TTL = 7 * 24 * 3600    # Lookups that are known to return nothing (empty result, 404)
+# Rate limits, 5xx and timeouts are never cached: the next run must retry them, not treat them as "not found"
+
+def normalize_url(url):
+    """Canonical form of a request URL: lower-cased scheme/host, decoded path, sorted query parameters."""
+    parts = urllib.parse.urlsplit(url)
+    query = urllib.parse.urlencode(sorted(urllib.parse.parse_qsl(parts.query, keep_blank_values=True)))
+    path = urllib.parse.quote(urllib.parse.unquote(parts.path))
+    return urllib.parse.urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, query, ""))
+
+def url_key(url):
+    return hashlib.sha1(normalize_url(url).encode("utf-8")).hexdigest()
+
+def parse_json(text):
+    """Decoded body, or None if it is not JSON (e.g. an HTML error page served with status 200)."""
+    try:
+        return json.loads(text)
+    except (TypeError, ValueError):
+        return None
+
+def is_empty_result(data):
+    """True for decoded 200 bodies that carry no book data ({} from api/books, zero hits from search)."""
+    if data in ({}, []):
+        return True
+    return isinstance(data, dict) and (data.get("totalItems") == 0 or data.get("numFound") == 0)
+
+class CachedResponse:
+    """The parts of a requests.Response the fetchers use."""
+
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+
+    @property
+    def ok(self):
+        return self.status_code == 200
+
+    def __bool__(self):
+        return self.ok
+
+    def json(self):
+        return json.loads(self.text)
+
+class ResponseCache:
+    """URL-keyed response cache in a single SQLite file, with a separate table for negative results."""
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self.enabled = bool(path) and path.lower() != "off"
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for table in ("responses", "negative"):
+                conn.execute(f'''
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        key TEXT PRIMARY KEY,
+                        url TEXT,
+                        status INTEGER,
+                        body BLOB,
+                        expires_at REAL
+                    )
+                ''')
+            # Transient failures stored by older versions would still answer "not found"
+            conn.execute("DELETE FROM negative WHERE status NOT IN (200, 404, 410)")
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def lookup(self, url):
+        """CachedResponse for a fresh entry (status != 200 for cached 404/410s), or None on a miss."""
+        if not self.enabled:
+            return None
+        key, now = url_key(url), time.time()
+        conn = self._conn()
+        for table in ("responses", "negative"):
+            row = conn.execute(f"SELECT status, body, expires_at FROM {table} WHERE key = ?", (key,)).fetchone()
+            if row and row[2] > now:
+                body = zlib.decompress(row[1]).decode("utf-8") if row[1] is not None else None
+                if table == "responses" and parse_json(body) is None:
+                    # Stored by an older version that cached non-JSON 200s; fetch it again
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    conn.commit()
+                    break
+                self._count("hits" if table == "responses" else "negative_hits")
+                return CachedResponse(row[0], body)
+        self._count("misses")
+        return None
+
+    def store(self, url, status, text=None):
+        """
+        Records the final outcome of a request (status None for timeouts/connection errors).
+        Only JSON data and definite negatives (empty result, 404, 410) are kept; transient failures
+        and 200s whose body is not JSON are dropped.
+        """
+        if not self.enabled:
+            return
+        if status == 200:
+            data = parse_json(text)
+            if data is None:
+                return
+            table, ttl = ("negative", NEGATIVE_TTL) if is_empty_result(data) else ("responses", POSITIVE_TTL)
+        elif status in (404, 410):
+            table, ttl = "negative", NEGATIVE_TTL
+        else:
+            return
+        body = zlib.compress(text.encode("utf-8")) if text is not None else None
+        other = "negative" if table == "responses" else "responses"
+        conn = self._conn()
+        conn.execute(f"DELETE FROM {other} WHERE key = ?", (url_key(url),))
+        conn.execute(
+            f"INSERT OR REPLACE INTO {table} (key, url, status, body, expires_at) VALUES (?, ?, ?, ?, ?)",
+            (url_key(url), normalize_url(url), status or 0, body, time.time() + ttl),
+        )
+        conn.commit()
+
+    def stats(self):
+        return {"hits": self.hits, "negative_hits": self.negative_hits, "misses": self.misses}
+
+cache = ResponseCache()
+
+def cached_get(url, timeout=5, before_fetch=None):
+    """
+    Single-attempt GET through the cache. Always returns a response-like object (status 0 on network errors).
+    before_fetch(url) is called only when the request really goes out (e.g. to wait for a rate limiter).
+    """
+    hit = cache.lookup(url)
+    if hit is not None:
+        return hit
+    if before_fetch is not None:
+        before_fetch(url)
+    try:
+        resp = requests.get(url, timeout=timeout)
+    except requests.RequestException:
+        cache.store(url, None)
+        return CachedResponse(0, None)
+    cache.store(url, resp.status_code, resp.text if resp.status_code == 200 else None)
+    return CachedResponse(resp.status_code, resp.text)
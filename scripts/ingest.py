@@ -1,21 +1,29 @@
 import pandas as pd
 import requests
-import sqlite3
 import sys
 import os
 import re
 import time
 import urllib.parse
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from threading import Lock
 
 # Add parent directory to path to import app modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app.database import get_db_connection, init_db
+from scripts import http_cache
+from scripts.bibkeys import with_bibkeys
+from scripts.book_writer import BookWriter, WriteError
+from scripts.export import export_books
+from scripts.endpoints import OPENLIBRARY_API_BASE, OPENLIBRARY_SEARCH, GOOGLE_BOOKS_VOLUMES, work_url, record_fetch
+from app.metrics import INGEST_LOOKUPS, INGEST_BOOKS, INGEST_LAST_PROGRESS
 
 CSV_PATH = "cleaned_books.csv"
 OUTPUT_CSV_ENRICHED = "books_enriched.csv"
-OPENLIBRARY_API_BASE = "https://openlibrary.org/api/books"
+# In-flight lookups for the async engine (per-host caps live in scripts/async_fetch.py)
+DEFAULT_CONCURRENCY = 500
+# CSV rows read (and checked against books) per step; lookups start after the first chunk
+CSV_CHUNK_ROWS = 5000
 
 print_lock = Lock()
 
@@ -41,57 +49,111 @@ def clean_description(desc):
     return clean if len(clean) > 20 else None
 
 def get_with_retry(url, timeout=5, retries=2):
-    """Fetch URL with basic retry logic."""
+    """Fetch URL with basic retry logic, answering from the local response cache when possible."""
+    cached = http_cache.cache.lookup(url)
+    if cached is not None:
+        record_fetch(url, "cached")
+        return cached if cached.ok else None
+    status = None
     for i in range(retries + 1):
         try:
             resp = requests.get(url, timeout=timeout)
-            if resp.status_code == 200:
-                return resp
-            if resp.status_code == 429:
-                time.sleep(2 * (i + 1)) # Wait longer for rate limits
         except:
+            record_fetch(url, "error")
             if i < retries:
                 time.sleep(1)
+            continue
+        status = resp.status_code
+        if resp.status_code == 200:
+            record_fetch(url, "ok")
+            http_cache.cache.store(url, 200, resp.text)
+            return resp
+        if resp.status_code == 429:
+            record_fetch(url, "rate_limited")
+            time.sleep(2 * (i + 1)) # Wait longer for rate limits
+        else:
+            record_fetch(url, "http_error")
+    http_cache.cache.store(url, status)
     return None
 
-def fetch_details_ultimate(isbn, title, author):
-    """Ultimate Fetch worker: Exhaustive search across multiple APIs and methods."""
+def get_json(url, timeout=5):
+    """
+    get_with_retry + JSON decoding: None if the request failed.
+    A body that is not JSON raises ValueError (the lookup steps treat it like the old .json() error).
+    """
+    resp = get_with_retry(url, timeout=timeout)
+    if resp is None:
+        return None
+    return resp.json()
+
+def drive_steps(steps, fetch):
+    """Runs a lookup_steps() generator to completion with a blocking fetch(url, timeout)."""
+    try:
+        request = next(steps)
+        while True:
+            try:
+                data = fetch(*request)
+            except ValueError as e:
+                request = steps.throw(e)
+            else:
+                request = steps.send(data)
+    except StopIteration as done:
+        return done.value
+
+def _scan_google(query, title, limit=3):
+    """Lookup step: first Google Books item with a usable description, or None."""
+    try:
+        g_url = f"{GOOGLE_BOOKS_VOLUMES}?q={urllib.parse.quote(query)}&maxResults={limit}"
+        data = yield (g_url, 4)
+        if data is not None:
+            if 'items' in data:
+                for item in data['items']:
+                    info = item['volumeInfo']
+                    desc = clean_description(info.get('description'))
+                    if desc:
+                        thumbnail = info['imageLinks'].get('thumbnail', '') if 'imageLinks' in info else None
+                        return {'description': desc, 'title': info.get('title', title), 'thumbnail': thumbnail}
+    except Exception: pass
+    return None
+
+def lookup_steps(isbn, title, author, bibkeys_data=None):
+    """
+    The exhaustive multi-API waterfall, written without any I/O.
+    Yields (url, timeout) requests and is sent back the decoded JSON (None if the request failed,
+    ValueError thrown in if the body was not JSON); the final record is the generator's return value.
+    Both ingestion engines drive this, so they produce the same records.
+    bibkeys_data is this ISBN's OpenLibrary record when it was already resolved in a batch
+    (see scripts/bibkeys.py); Method 2 then needs no request of its own.
+    The record's 'method' names the step that found the description (None if none did).
+    """
     description = None
     cover_image = ""
     result_title = title
+    method = None
 
-    # HELPER: Scan Google Books Items
-    def scan_google(query, limit=3):
+    def apply_google(hit):
         nonlocal description, cover_image, result_title
-        try:
-            g_url = f"https://www.googleapis.com/books/v1/volumes?q={urllib.parse.quote(query)}&maxResults={limit}"
-            resp = get_with_retry(g_url, timeout=4)
-            if resp:
-                data = resp.json()
-                if 'items' in data:
-                    for item in data['items']:
-                        info = item['volumeInfo']
-                        desc = clean_description(info.get('description'))
-                        if desc:
-                            description = desc
-                            result_title = info.get('title', title)
-                            if not cover_image and 'imageLinks' in info:
-                                cover_image = info['imageLinks'].get('thumbnail', '')
-                            return True
-        except: pass
-        return False
+        description = hit['description']
+        result_title = hit['title']
+        if not cover_image and hit['thumbnail'] is not None:
+            cover_image = hit['thumbnail']
 
     # Method 1: Google Books ISBN
     if isbn and not str(isbn).startswith("N/A"):
-        if scan_google(f"isbn:{isbn}"): pass
+        hit = yield from _scan_google(f"isbn:{isbn}", title)
+        if hit:
+            apply_google(hit)
+            method = "google_isbn"
 
     # Method 2: OpenLibrary ISBN
     if not description and isbn and not str(isbn).startswith("N/A"):
         try:
-            url = f"{OPENLIBRARY_API_BASE}?bibkeys=ISBN:{isbn}&jscmd=details&format=json"
-            resp = get_with_retry(url, timeout=3)
-            if resp:
-                data = resp.json()
+            if bibkeys_data is not None:
+                data = bibkeys_data
+            else:
+                url = f"{OPENLIBRARY_API_BASE}?bibkeys=ISBN:{isbn}&jscmd=details&format=json"
+                data = yield (url, 3)
+            if data is not None:
                 key = f"ISBN:{isbn}"
                 if key in data:
                     det = data[key].get('details', {})
@@ -100,10 +162,12 @@ def fetch_details_ultimate(isbn, title, author):
                         cover_image = f"https://covers.openlibrary.org/b/id/{data[key]['covers'][0]}-M.jpg"
                     if not description and 'works' in data[key]:
                         work_key = data[key]['works'][0].get('key')
-                        w_resp = get_with_retry(f"https://openlibrary.org{work_key}.json", timeout=3)
-                        if w_resp:
-                            description = clean_description(w_resp.json().get('description'))
-        except: pass
+                        w_data = yield (work_url(work_key), 3)
+                        if w_data is not None:
+                            description = clean_description(w_data.get('description'))
+        except Exception: pass
+        if description:
+            method = "openlibrary_isbn"
 
     # Method 3: Google Books Title + Author
     if not description:
@@ -111,41 +175,93 @@ def fetch_details_ultimate(isbn, title, author):
         if author and not pd.isna(author):
             safe_author = str(author).split(',')[0].strip()
             query += f" inauthor:{safe_author}"
-        scan_google(query, limit=3)
+        hit = yield from _scan_google(query, title, limit=3)
+        if hit:
+            apply_google(hit)
+            method = "google_title_author"
 
     # Method 4: Google Books Title ONLY (Broad)
     if not description:
-        scan_google(title, limit=3)
+        hit = yield from _scan_google(title, title, limit=3)
+        if hit:
+            apply_google(hit)
+            method = "google_title"
 
     # Method 5: OpenLibrary Title Search (Multi-doc)
     if not description:
         try:
             encoded_title = urllib.parse.quote(title)
-            url = f"https://openlibrary.org/search.json?title={encoded_title}&limit=3"
-            resp = get_with_retry(url, timeout=4)
-            if resp:
-                data = resp.json()
+            url = f"{OPENLIBRARY_SEARCH}?title={encoded_title}&limit=3"
+            data = yield (url, 4)
+            if data is not None:
                 if data.get('docs'):
                     for doc in data['docs']:
                         work_key = doc.get('key')
                         if work_key:
-                            w_resp = get_with_retry(f"https://openlibrary.org{work_key}.json", timeout=3)
-                            if w_resp:
-                                desc = clean_description(w_resp.json().get('description'))
+                            w_data = yield (work_url(work_key), 3)
+                            if w_data is not None:
+                                desc = clean_description(w_data.get('description'))
                                 if desc:
                                     description = desc
+                                    method = "openlibrary_search"
                                     break
-        except: pass
+        except Exception: pass
 
     return {
         'title': result_title,
         'description': description,
         'cover_image': cover_image,
         'isbn': isbn,
-        'has_description': description is not None
+        'has_description': description is not None,
+        'method': method,
     }
 
-def ingest_data(limit=40000, threads=65):
+def fetch_details_ultimate(isbn, title, author, bibkeys_data=None):
+    """Ultimate Fetch worker: Exhaustive search across multiple APIs and methods (blocking)."""
+    return drive_steps(lookup_steps(isbn, title, author, bibkeys_data), get_json)
+
+def iter_new_rows(csv_path, limit, chunk_rows=CSV_CHUNK_ROWS):
+    """
+    Streams (isbn, title, author, year) for CSV rows whose ISBN is not in books yet, up to `limit`.
+    The CSV is read chunk by chunk; each chunk is checked against books with one anti-join on a temp table.
+    """
+    yielded = 0
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_rows, dtype={'ISBN': str}):
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        staged = zip(
+            (str(v).strip() for v in chunk['ISBN']),
+            (str(v) if v is not None else 'nan' for v in chunk['Title']),
+            chunk['Author/Editor'].tolist(),
+            chunk['Year'].tolist(),
+        )
+        conn = get_db_connection()
+        try:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS csv_chunk (pos INTEGER PRIMARY KEY, isbn TEXT, title TEXT, author TEXT, year)")
+            conn.execute("DELETE FROM csv_chunk")
+            conn.executemany("INSERT INTO csv_chunk (isbn, title, author, year) VALUES (?, ?, ?, ?)", staged)
+            new_rows = conn.execute('''
+                SELECT c.isbn, c.title, c.author, c.year FROM csv_chunk c
+                WHERE NOT EXISTS (SELECT 1 FROM books b WHERE b.isbn = c.isbn)
+                ORDER BY c.pos
+                LIMIT ?
+            ''', (limit - yielded,)).fetchall()
+            conn.execute("DELETE FROM csv_chunk")
+            conn.commit()
+        finally:
+            conn.close()
+
+        for row in new_rows:
+            yield tuple(row)
+        yielded += len(new_rows)
+        if yielded >= limit:
+            return
+
+def ingest_data(limit=40000, threads=65, engine="async", concurrency=DEFAULT_CONCURRENCY, progress=None):
+    """
+    Fetches details for up to `limit` new CSV rows and inserts the books that have a description.
+    progress(counts), if given, is called with the running counts at every heartbeat.
+    Returns the final counts (None if the CSV is missing).
+    """
     start_time = time.time()
     init_db()
     
@@ -153,84 +269,111 @@ def ingest_data(limit=40000, threads=65):
         safe_print(f"Error: {CSV_PATH} not found.")
         return
 
-    df = pd.read_csv(CSV_PATH)
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT isbn FROM books")
-    existing_isbns = {str(row[0]).strip() for row in cursor.fetchall()}
-    conn.close()
-
-    rows_to_process = []
-    for _, row in df.iterrows():
-        isbn = str(row['ISBN']).strip()
-        if isbn in existing_isbns: continue
-        rows_to_process.append((isbn, str(row['Title']), row['Author/Editor'], row['Year']))
-        if len(rows_to_process) >= limit: break
-
-    total_to_process = len(rows_to_process)
-    safe_print(f"🚀 ULTIMATE COVERAGE MODE: Hunting {total_to_process} missing books with {threads} threads...")
-
-    inserted_count = 0
+    # OpenLibrary ISBN records are resolved 100 per request ahead of the per-book lookups
+    jobs = with_bibkeys(iter_new_rows(CSV_PATH, limit), lambda r: r[0], get_json)
+
+    if engine == "async":
+        try:
+            import aiohttp  # noqa: F401
+        except ImportError:
+            safe_print("aiohttp is not installed; falling back to the thread engine.")
+            engine = "threads"
+
+    if engine == "async":
+        safe_print(f"🚀 ULTIMATE COVERAGE MODE: Hunting up to {limit} missing books with {concurrency} async lookups...")
+    else:
+        safe_print(f"🚀 ULTIMATE COVERAGE MODE: Hunting up to {limit} missing books with {threads} threads...")
+
+    found_count = 0
     processed_count = 0
-    batch_data = []
+    # Found books go to one writer thread that inserts them in large batches
+    writer = BookWriter(log=safe_print)
+    writer.start()
 
-    def commit_batch(data_list):
-        db_conn = get_db_connection()
-        db_cursor = db_conn.cursor()
-        for b in data_list:
-            try:
-                db_cursor.execute('''
-                    INSERT INTO books (isbn, title, description, author, cover_image, publish_year)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (b['isbn'], b['title'], b['description'], b['author'], b['cover_image'], b['publish_year']))
-            except sqlite3.IntegrityError: pass
-        db_conn.commit()
-        db_conn.close()
-
-    with ThreadPoolExecutor(max_workers=threads) as executor:
-        future_to_book = {executor.submit(fetch_details_ultimate, r[0], r[1], r[2]): r for r in rows_to_process}
-        
-        for future in as_completed(future_to_book):
-            processed_count += 1
-            orig_row = future_to_book[future]
-            try:
-                res = future.result()
-                if res['has_description']:
-                    batch_data.append({
-                        'isbn': res['isbn'], 'title': res['title'], 'description': res['description'],
-                        'author': orig_row[2], 'cover_image': res['cover_image'], 'publish_year': orig_row[3]
-                    })
-            except Exception:
-                pass
+    def counts():
+        return {
+            "processed": processed_count,
+            "found": found_count,
+            "inserted": writer.written,
+            "elapsed_seconds": time.time() - start_time,
+        }
+
+    def on_result(job, res):
+        nonlocal found_count, processed_count
+        orig_row = job[0]
+        processed_count += 1
+        INGEST_BOOKS.inc(stage="processed")
+        INGEST_LOOKUPS.inc(method=(res['method'] or "none") if res else "error")
+        if res and res['has_description']:
+            found_count += 1
+            INGEST_BOOKS.inc(stage="found")
+            writer.put((
+                res['isbn'], res['title'], res['description'],
+                orig_row[2], res['cover_image'], orig_row[3]
+            ))
 
-            if len(batch_data) >= 3:
-                commit_batch(batch_data)
-                inserted_count += len(batch_data)
-                elapsed = time.time() - start_time
-                rate = (inserted_count / elapsed) * 60
-                safe_print(f"  ✨ Added {len(batch_data)} (Total: {inserted_count}) | Checked: {processed_count}/{total_to_process} | Speed: {rate:.1f}/min")
-                batch_data = []
+        # Heartbeat logging
+        if processed_count % 10 == 0:
+             safe_print(f"  💓 Scanning... {processed_count} checked. Found {found_count} in this run.")
+             INGEST_LAST_PROGRESS.set(time.time())
+             if progress is not None:
+                 progress(counts())
 
-            # Heartbeat logging
-            if processed_count % 10 == 0:
-                 safe_print(f"  💓 Scanning... {processed_count}/{total_to_process} checked. Found {inserted_count + len(batch_data)} in this run.")
+    try:
+        if engine == "async":
+            from scripts.async_fetch import run_lookups
+            run_lookups(
+                jobs, lambda job: lookup_steps(*job[0][:3], job[1]), on_result, concurrency=concurrency
+            )
+        else:
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                # Keep a bounded window of lookups in flight so rows are pulled from the CSV as workers free up
+                future_to_book = {}
 
-    if batch_data:
-        commit_batch(batch_data)
-        inserted_count += len(batch_data)
+                def submit_more():
+                    for job in jobs:
+                        future_to_book[executor.submit(fetch_details_ultimate, *job[0][:3], job[1])] = job
+                        if len(future_to_book) >= threads * 2:
+                            return
 
-    safe_print(f"🏁 ULTIMATE FETCH COMPLETE! Added {inserted_count} books. Total time: {time.time()-start_time:.1f}s")
+                submit_more()
+                while future_to_book:
+                    done, _ = wait(future_to_book, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        try:
+                            res = future.result()
+                        except Exception:
+                            res = None
+                        on_result(future_to_book.pop(future), res)
+                    submit_more()
+    finally:
+        write_stats = writer.close()
+
+    safe_print(f"🏁 ULTIMATE FETCH COMPLETE! Added {write_stats['written']} books. Total time: {time.time()-start_time:.1f}s")
+    safe_print(f"  💾 Writer: {write_stats['batches']} commits, {write_stats['duplicates']} duplicates skipped, {write_stats['write_rows_per_second']:.0f} rows/s")
+    if write_stats["unwritten"]:
+        # Fail the run (and the /sync job) rather than report success with books missing
+        raise WriteError(f"{write_stats['unwritten']} found books could not be written: {writer.error}")
+    cache_stats = http_cache.cache.stats()
+    safe_print(f"  🗃️ HTTP cache: {cache_stats['hits']} hits, {cache_stats['negative_hits']} known misses, {cache_stats['misses']} fetched")
     
-    # Final Export
-    conn = get_db_connection()
-    pd.read_sql_query("SELECT * FROM books", conn).to_csv(OUTPUT_CSV_ENRICHED, index=False)
-    conn.close()
+    # Final Export (streamed in batches, so memory does not grow with the table)
+    exported = export_books(OUTPUT_CSV_ENRICHED)
+    safe_print(f"  📤 Exported {exported} books to {OUTPUT_CSV_ENRICHED}")
+
+    final = counts()
+    final["commits"] = write_stats["batches"]
+    final["write_rows_per_second"] = write_stats["write_rows_per_second"]
+    if progress is not None:
+        progress(final)
+    return final
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument("--limit", type=int, default=40000)
     parser.add_argument("--threads", type=int, default=65)
+    parser.add_argument("--engine", choices=["async", "threads"], default="async")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
     args = parser.parse_args()
-    ingest_data(limit=args.limit, threads=args.threads)
+    ingest_data(limit=args.limit, threads=args.threads, engine=args.engine, concurrency=args.concurrency)
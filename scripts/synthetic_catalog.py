@@ -0,0 +1,132 @@
+import argparse
+import itertools
+import os
+import sqlite3
+import sys
+import time
+import numpy as np
+
+# Allow running as `python scripts/synthetic_catalog.py` from the repo root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import database
+
+SIZES = (1000, 10000, 100000, 1000000)
+INSERT_BATCH = 10000
+VOCAB_SIZE = 20000
+TOPICS = 400
+TOPIC_WORDS = 80
+# Share of books left with the ingestion placeholder instead of a description
+PLACEHOLDER_FRACTION = 0.15
+PLACEHOLDER = "Description not available."
+INSERT_SQL = "INSERT INTO books (isbn, title, description, author, cover_image, publish_year) VALUES (?, ?, ?, ?, ?, ?)"
+
+_SYLLABLES = ("ka", "lo", "mi", "ren", "tas", "vel", "dor", "an", "is", "quo", "bri", "sel", "um", "th", "gar", "ny")
+
+def _vocabulary(rng, size):
+    """Pronounceable pseudo-words (3 to 4 syllables), unique, so TF-IDF sees a realistic vocabulary."""
+    words, seen = [], set()
+    while len(words) < size:
+        word = "".join(rng.choice(_SYLLABLES, rng.integers(3, 5)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return np.array(words)
+
+class CatalogGenerator:
+    """
+    Deterministic fake books: descriptions mix a few topics over a Zipf-distributed vocabulary
+    with log-normal lengths (median about 90 words), and authors follow a Zipf distribution,
+    so a few authors have hundreds of books and most have one or two.
+    """
+
+    def __init__(self, seed=0):
+        self.rng = np.random.default_rng(seed)
+        self.vocab = _vocabulary(self.rng, VOCAB_SIZE)
+        # Word frequencies: rank^-1.1, as in natural text
+        weights = 1.0 / np.arange(1, VOCAB_SIZE + 1) ** 1.1
+        self.word_cdf = np.cumsum(weights / weights.sum())
+        self.topics = [self.rng.choice(VOCAB_SIZE, TOPIC_WORDS, replace=False) for _ in range(TOPICS)]
+        self.first_names = np.char.capitalize(_vocabulary(self.rng, 400))
+        self.last_names = np.char.capitalize(_vocabulary(self.rng, 2000))
+
+    def _words(self, count, topics):
+        # Two thirds topic words, one third background words
+        on_topic = self.rng.random(count) < 0.66
+        background = np.minimum(np.searchsorted(self.word_cdf, self.rng.random(count)), VOCAB_SIZE - 1)
+        picks = topics[self.rng.integers(0, len(topics), count)]
+        return " ".join(self.vocab[np.where(on_topic, picks, background)])
+
+    def _author(self, rank):
+        # Spread popular ranks over the name tables so top authors do not share a surname
+        a = (rank * 7919) % (len(self.last_names) * len(self.first_names))
+        return f"{self.last_names[a % len(self.last_names)]}, {self.first_names[a // len(self.last_names)]}"
+
+    def rows(self, count, start=0):
+        """Yields (isbn, title, description, author, cover_image, publish_year) for books start..start+count."""
+        n_authors = max(10, count // 6)
+        lengths = np.clip(self.rng.lognormal(np.log(90), 0.6, count), 5, 600).astype(int)
+        placeholders = self.rng.random(count) < PLACEHOLDER_FRACTION
+        years = np.clip(np.rint(2024 - self.rng.exponential(25, count)), 1850, 2024).astype(int)
+        authors = np.minimum(self.rng.zipf(1.6, count), n_authors) - 1
+        for i in range(count):
+            topics = np.concatenate([self.topics[t] for t in self.rng.choice(TOPICS, self.rng.integers(1, 4), replace=False)])
+            title = self._words(int(self.rng.integers(1, 6)), topics).title()
+            description = PLACEHOLDER if placeholders[i] else self._words(int(lengths[i]), topics) + "."
+            isbn = f"979{start + i:010d}"
+            yield (
+                isbn, title, description, self._author(int(authors[i])),
+                f"https://covers.openlibrary.org/b/isbn/{isbn}-L.jpg", int(years[i]),
+            )
+
+def generate_catalog(path, rows, seed=0, batch_rows=INSERT_BATCH):
+    """Creates a books.db at `path` with `rows` synthetic books (schema, indexes and FTS as in production)."""
+    if os.path.exists(path):
+        os.remove(path)
+    db_name = database.DB_NAME
+    database.DB_NAME = path
+    try:
+        database.init_db()
+        database.pool.discard()
+    finally:
+        database.DB_NAME = db_name
+
+    rows_iter = CatalogGenerator(seed).rows(rows)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    while True:
+        batch = list(itertools.islice(rows_iter, batch_rows))
+        if not batch:
+            break
+        conn.executemany(INSERT_SQL, batch)
+        conn.commit()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+
+def catalog_path(directory, rows, seed=0):
+    return os.path.join(directory, f"books_{rows}_s{seed}.db")
+
+def ensure_catalog(directory, rows, seed=0):
+    """Path of the cached synthetic catalog for (rows, seed), generating it on first use."""
+    os.makedirs(directory, exist_ok=True)
+    path = catalog_path(directory, rows, seed)
+    if not os.path.exists(path):
+        start = time.time()
+        generate_catalog(path + ".tmp", rows, seed)
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(path + ".tmp" + suffix):
+                os.remove(path + ".tmp" + suffix)
+        os.rename(path + ".tmp", path)
+        print(f"Generated {rows} synthetic books in {time.time() - start:.1f}s -> {path}")
+    return path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic books.db catalogs for benchmarking.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000], help=f"Catalog sizes (e.g. {' '.join(map(str, SIZES))})")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dir", default="bench_data", help="Where the catalogs are written")
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        ensure_catalog(args.dir, rows, args.seed)
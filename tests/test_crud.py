@@ -0,0 +1,24 @@
+import os
+import sys
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import crud, database
+
+@pytest.fixture
+def books_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_NAME", str(tmp_path / "books.db"))
+    database.init_db()
+    with database.db_connection() as conn:
+        conn.execute(
+            "INSERT INTO books (isbn, title, description, author) VALUES (?, ?, ?, ?)",
+            ("1", "Dragon <script>alert(1)</script>", "A dragon & a <img src=x onerror=alert(1)> knight", "A"),
+        )
+        conn.commit()
+
+def test_highlights_escape_stored_markup(books_db):
+    [book] = crud.search_books("dragon")
+    assert book["title_highlight"] == "<mark>Dragon</mark> &lt;script&gt;alert(1)&lt;/script&gt;"
+    assert "<img" not in book["snippet"]
+    assert book["snippet"].startswith("A <mark>dragon</mark> &amp; a &lt;img")
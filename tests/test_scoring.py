@@ -0,0 +1,36 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.scoring import top_k
+
+def reference(doc_ids, scores, k):
+    """The tie policy top_k promises: a stable ascending argsort read from the end."""
+    order = np.argsort(scores, kind='stable')[::-1][:k] if k > 0 else np.empty(0, dtype=np.int64)
+    return doc_ids[order], scores[order]
+
+@pytest.mark.parametrize("k", [0, 1, 3, 5, 10, 50])
+def test_matches_stable_argsort_with_ties(k):
+    rng = np.random.default_rng(k)
+    for _ in range(200):
+        n = int(rng.integers(1, 40))
+        doc_ids = np.sort(rng.choice(1000, n, replace=False))
+        # Few distinct values, so most selections cut through a run of ties
+        scores = rng.integers(0, 4, n) / 4.0
+        got_ids, got_scores = top_k(doc_ids, scores, k)
+        want_ids, want_scores = reference(doc_ids, scores, k)
+        np.testing.assert_array_equal(got_ids, want_ids)
+        np.testing.assert_array_equal(got_scores, want_scores)
+
+def test_ties_prefer_larger_doc_id():
+    doc_ids = np.array([2, 5, 7, 9])
+    scores = np.array([0.5, 0.9, 0.5, 0.5])
+    ids, _ = top_k(doc_ids, scores, 3)
+    assert ids.tolist() == [5, 9, 7]
+
+def test_empty_input():
+    ids, scores = top_k(np.empty(0, dtype=np.int64), np.empty(0), 5)
+    assert len(ids) == 0 and len(scores) == 0